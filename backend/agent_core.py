@@ -1,17 +1,19 @@
 from __future__ import annotations
 
 # ── std / typing / env ───────────────────────────────────
-import os, json, warnings
-from typing import List, Literal, Dict, Any, Optional
+import os, json, logging, warnings, asyncio
+from typing import List, Literal, Dict, Any, Optional, AsyncIterator
 from dotenv import load_dotenv
 from langchain_core.tools import tool # <── ADD THIS IMPORT
 
 # ── third-party ──────────────────────────────────────────
 from pydantic import BaseModel, HttpUrl
-from langgraph.checkpoint.memory import InMemorySaver
+from checkpointing import BoundedInMemorySaver, DurableSqliteSaver
+from singleflight import AsyncSingleFlight
+from metrics import PAYLOAD_VALIDATION_SECONDS, prometheus_callback
 from langgraph.prebuilt import create_react_agent
 from langchain.chat_models import init_chat_model
-from langchain_core.messages import AIMessage
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, ToolMessage
 from langchain_community.document_loaders.csv_loader import CSVLoader   # (still used elsewhere)
 
 # ═════════════ 1. STRUCTURED RESPONSE SCHEMA ═════════════
@@ -43,29 +45,76 @@ def display_product_recommendations(heading: str, items: List[ProductItem]) -> s
     """
     # The LLM provides the heading and items.
     # WE provide the static 'type' to guarantee it's always correct.
-    payload = ProductPayload(
-        type="product_recommendations", # <── Hardcoded and always correct
-        heading=heading,
-        items=items
-    )
-    # This tool still returns the guaranteed clean, full JSON string.
-    return payload.model_dump_json()
+    with PAYLOAD_VALIDATION_SECONDS.time():
+        payload = ProductPayload(
+            type="product_recommendations", # <── Hardcoded and always correct
+            heading=heading,
+            items=items
+        )
+        # This tool still returns the guaranteed clean, full JSON string.
+        return payload.model_dump_json()
 
 # ═════════════ 2. ENV / LLM / MEMORY SETUP ═══════════════
 
 load_dotenv()
 warnings.filterwarnings("ignore")
+log = logging.getLogger(__name__)
 
-os.environ["LANGCHAIN_TRACING_V2"]   = "true"
+# Tracing stays on unless LANGCHAIN_TRACING_V2 is set (offline load tests set it to "false")
+os.environ["LANGCHAIN_TRACING_V2"]   = os.getenv("LANGCHAIN_TRACING_V2", "true")
 os.environ["LANGCHAIN_ENDPOINT"]     = "https://api.smith.langchain.com"
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
-os.environ["LANGCHAIN_API_KEY"]      = os.getenv("LANGCHAIN_API_KEY")
-os.environ["GOOGLE_API_KEY"]         = os.getenv("GOOGLE_API_KEY")
+for _key in ("LANGCHAIN_API_KEY", "GOOGLE_API_KEY"):
+    if os.getenv(_key):
+        os.environ[_key] = os.getenv(_key)
+
+# init_chat_model spec, or "fake" / "fake:<script.json>" for the offline scripted model
+CHAT_MODEL = os.getenv("JARIR_CHAT_MODEL", "google_genai:gemini-2.5-flash")
+
+
+def make_chat_model(spec: str = CHAT_MODEL) -> Any:
+    if spec == "fake" or spec.startswith("fake:"):
+        from fake_chat_model import ScriptedChatModel
+        return ScriptedChatModel.from_script(spec[len("fake:"):] or None)
+    return init_chat_model(spec)
+
+
+llm     = make_chat_model()
+
+# Conversation state per session: LRU/TTL-evicted threads, newest checkpoints only
+MAX_SESSIONS             = int(os.getenv("JARIR_MAX_SESSIONS", "1000"))
+SESSION_TTL_S            = float(os.getenv("JARIR_SESSION_TTL_S", "3600"))
+MAX_MESSAGES_PER_SESSION = int(os.getenv("JARIR_MAX_MESSAGES_PER_SESSION", "40"))
+
+# "memory" (per worker) or "sqlite" (shared by all workers on the host, see setup_checkpointer)
+CHECKPOINTER          = os.getenv("JARIR_CHECKPOINTER", "memory")
+CHECKPOINT_DB         = os.getenv("JARIR_CHECKPOINT_DB", os.path.join(os.path.dirname(__file__), "..", ".cache", "checkpoints.sqlite"))
+CHECKPOINT_COMPACT_S  = float(os.getenv("JARIR_CHECKPOINT_COMPACT_S", "600"))
+CHECKPOINT_SQLITE_TTL = float(os.getenv("JARIR_CHECKPOINT_SQLITE_TTL_S", str(7 * 24 * 3600)))
+
+memory  = BoundedInMemorySaver(max_threads=MAX_SESSIONS, ttl=SESSION_TTL_S)
+CLI_THREAD_ID = "cli"
+
 
-llm     = init_chat_model("google_genai:gemini-2.5-flash")
-memory  = InMemorySaver()
-THREAD_ID = "1"
-config   = {"configurable": {"thread_id": THREAD_ID}}
+# Callback handlers attached to every turn (e.g. timing.StageTimer); see add_callback
+_callbacks: List[Any] = []
+
+
+def add_callback(handler: Any) -> None:
+    """Attach a LangChain callback handler to all subsequent turns."""
+    if handler not in _callbacks:
+        _callbacks.append(handler)
+
+
+add_callback(prometheus_callback)
+
+
+def thread_config(session_id: str) -> Dict[str, Any]:
+    """LangGraph config that scopes the conversation to one session."""
+    config: Dict[str, Any] = {"configurable": {"thread_id": session_id}}
+    if _callbacks:
+        config["callbacks"] = list(_callbacks)
+    return config
 
 
 
@@ -82,6 +131,8 @@ from tools import (
     retrieve_information_about_brand,
     retrieve_information_about_product_type,
 )
+from router import try_fast_path
+from response_cache import SEMANTIC_CACHE_ENABLED, semantic_cache
 
 # ═════════════ 4. PROMPT (synced with notebook) ═════════
 agent_prompt = """
@@ -106,55 +157,169 @@ You are Jarir Bookstores Website product salesman with live access to our full p
 ## ⚠️ CRITICAL WORKFLOW ⚠️
 - For ALL product recommendation requests, you MUST use ONLY the `get_product_recommendations` tool.
 - When you have gathered enough specific information from the user to make a recommendation, you MUST call the `get_product_recommendations` tool.
-- Your final response for a product request MUST be ONLY the raw, direct JSON output from this tool. Do not add any conversational text, summaries, wrappers, or markdown code blocks around it. The frontend system can only process the raw JSON.
-- Crucially, after outputting the raw JSON from getproductrecommendations, your turn is complete, and you must not generate any further output, including repeating the JSON or adding any other text.
+- The tool's output is shown to the customer directly and ends your turn, so do not repeat, summarize, or reformat it.
 """
 
 
 # ═════════════ 5. AGENT GRAPH (now includes AIO tool) ════
 
-graph = create_react_agent(
-    llm,
-    tools=[
-        # consolidate_products, #color checker
-        get_product_recommendations,
-        # display_product_recommendations,    #json tool (not used). it is used in the get_product_recommendations tool
-        # Individual check tools removed - they should only be used internally by get_product_recommendations
-        # check_gaming_laptops,
-        # check_AIO,
-        # check_laptops,
-        # check_tablets,
-        # check_twoin1,
-        # check_desktops,
-        retrieve_information_about_brand,
-        retrieve_information_about_product_type,
-    ],
-    prompt=agent_prompt,
-    checkpointer=memory,
-)
+AGENT_TOOLS = [
+    # consolidate_products, #color checker
+    get_product_recommendations,
+    # display_product_recommendations,    #json tool (not used). it is used in the get_product_recommendations tool
+    # Individual check tools removed - they should only be used internally by get_product_recommendations
+    # check_gaming_laptops,
+    # check_AIO,
+    # check_laptops,
+    # check_tablets,
+    # check_twoin1,
+    # check_desktops,
+    retrieve_information_about_brand,
+    retrieve_information_about_product_type,
+]
+
+def build_graph(checkpointer: Any) -> Any:
+    return create_react_agent(
+        llm,
+        tools=AGENT_TOOLS,
+        prompt=agent_prompt,
+        checkpointer=checkpointer,
+    )
+
+
+graph = build_graph(memory)
+
+
+def set_chat_model(model: Any) -> None:
+    """Swap the chat model (tests, load tests) and rebuild the graph on the current checkpointer."""
+    global llm, graph
+    llm = model
+    graph = build_graph(memory)
+
+
+async def setup_checkpointer() -> None:
+    """
+    Swap in the checkpointer selected by JARIR_CHECKPOINTER. Call once from the
+    server's startup hook: the SQLite saver must be created inside the event loop.
+    """
+    global memory, graph
+    if CHECKPOINTER != "sqlite":
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(CHECKPOINT_DB)), exist_ok=True)
+    saver = await DurableSqliteSaver.open(CHECKPOINT_DB, ttl=CHECKPOINT_SQLITE_TTL)
+    if CHECKPOINT_COMPACT_S > 0:
+        saver.start_compaction(CHECKPOINT_COMPACT_S)
+    memory, graph = saver, build_graph(saver)
+
+
+async def close_checkpointer() -> None:
+    if isinstance(memory, DurableSqliteSaver):
+        await memory.aclose()
+
+
+async def acheckpointer_stats() -> Dict[str, Any]:
+    """Session count (and, in memory, bytes held) of the active checkpointer."""
+    if isinstance(memory, DurableSqliteSaver):
+        return await memory.astats()
+    return memory.stats()
+
+
+async def _aflush_checkpoints() -> None:
+    # durable savers batch their commits; make this turn visible to every worker now
+    if isinstance(memory, DurableSqliteSaver):
+        await memory.aflush()
 
 # ═════════════ 7. PUBLIC API (callable from backend) ═════
 
-def generate_response(user_msg: str, context: Optional[Dict[str, Any]] = None) -> str:
-    print("\n----------- NEW REQUEST RECEIVED -----------")
-    merged = user_msg if not context else f"{user_msg}\n\n[context]\n{json.dumps(context, ensure_ascii=False)}"
-    inputs = {"messages": [{"role": "user", "content": merged}]}
+# Upper bound for one agent turn on the async path (seconds, 0 = no limit)
+CHAT_TIMEOUT_S = float(os.getenv("JARIR_CHAT_TIMEOUT_S", "120"))
+
+# In-flight /chat turns keyed by (session, message, context); see agenerate_response
+_turn_flight = AsyncSingleFlight()
+
+
+def _merged_message(user_msg: str, context: Optional[Dict[str, Any]]) -> str:
+    return user_msg if not context else f"{user_msg}\n\n[context]\n{json.dumps(context, ensure_ascii=False)}"
+
 
-    tool_output: Optional[str] = None
-    tool_name: Optional[str] = None
-    reply: Optional[str] = None
+def _build_inputs(user_msg: str, context: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {"messages": [{"role": "user", "content": _merged_message(user_msg, context)}]}
 
-    for chunk in graph.stream(inputs, stream_mode="updates", config=config):
-        print(f"[DEBUG] Agent step: {chunk}")
+
+def _recorded_turn(user_msg: str, context: Optional[Dict[str, Any]], reply: str) -> Dict[str, Any]:
+    """State update that stores a turn answered outside the graph like an agent turn."""
+    return {"messages": [HumanMessage(content=_merged_message(user_msg, context)), AIMessage(content=reply)]}
+
+
+def _fast_path(user_msg: str, context: Optional[Dict[str, Any]], config: Dict[str, Any]) -> Optional[str]:
+    payload = try_fast_path(user_msg)
+    if payload is None:
+        return None
+    reply = json.dumps(normalize_product_payload(payload))
+    # as_node="agent": the stored turn ends like one where the model answered without tools
+    graph.update_state(config, _recorded_turn(user_msg, context, reply), as_node="agent")
+    return reply
+
+
+async def _afast_path(user_msg: str, context: Optional[Dict[str, Any]], config: Dict[str, Any]) -> Optional[str]:
+    payload = await asyncio.to_thread(try_fast_path, user_msg)
+    if payload is None:
+        return None
+    reply = json.dumps(normalize_product_payload(payload))
+    await graph.aupdate_state(config, _recorded_turn(user_msg, context, reply), as_node="agent")
+    return reply
+
+
+def _semantic_cache_eligible(context: Optional[Dict[str, Any]], config: Dict[str, Any]) -> bool:
+    """Only opening messages without page context are answered from / stored in the semantic cache."""
+    # the thread is only read (a checkpoint round trip) when the cache could apply
+    if not SEMANTIC_CACHE_ENABLED or context:
+        return False
+    return not graph.get_state(config).values.get("messages")
+
+
+async def _asemantic_cache_eligible(context: Optional[Dict[str, Any]], config: Dict[str, Any]) -> bool:
+    if not SEMANTIC_CACHE_ENABLED or context:
+        return False
+    return not (await graph.aget_state(config)).values.get("messages")
+
+
+def _cached_reply(user_msg: str, context: Optional[Dict[str, Any]], config: Dict[str, Any]) -> Optional[str]:
+    reply = semantic_cache.lookup(user_msg)
+    if reply is not None:
+        graph.update_state(config, _recorded_turn(user_msg, context, reply), as_node="agent")
+    return reply
+
+
+async def _acached_reply(user_msg: str, context: Optional[Dict[str, Any]], config: Dict[str, Any]) -> Optional[str]:
+    reply = await asyncio.to_thread(semantic_cache.lookup, user_msg)
+    if reply is not None:
+        await graph.aupdate_state(config, _recorded_turn(user_msg, context, reply), as_node="agent")
+    return reply
+
+
+class _TurnCollector:
+    """Folds graph.(a)stream(..., stream_mode="updates") chunks into the turn's final reply."""
+
+    def __init__(self) -> None:
+        self.tool_output: Optional[str] = None
+        self.tool_name: Optional[str] = None
+        self.reply: Optional[str] = None
+        # True while the latest step was a tool's (a return_direct tool ends the turn there)
+        self.ended_on_tool = False
+
+    def feed(self, chunk: Dict[str, Any]) -> None:
+        log.debug("Agent step: %s", chunk)
         # Prefer real tool outputs if present
         tools_chunk = chunk.get("tools")
         if tools_chunk:
+            self.ended_on_tool = True
             # Handle the new format: {'messages': [ToolMessage(...)]}
             if isinstance(tools_chunk, dict) and "messages" in tools_chunk:
                 for msg in tools_chunk["messages"]:
                     if hasattr(msg, 'content'):  # It's a ToolMessage object
-                        tool_output = msg.content
-                        tool_name = getattr(msg, 'name', None)
+                        self.tool_output = msg.content
+                        self.tool_name = getattr(msg, 'name', None)
                         break
             # Original logic for other formats
             elif isinstance(tools_chunk, list):
@@ -162,90 +327,385 @@ def generate_response(user_msg: str, context: Optional[Dict[str, Any]] = None) -
                     if isinstance(t, dict):
                         out = t.get("output") or t.get("result") or t.get("tool_output")
                         if out:
-                            tool_output = out
-                            tool_name = t.get("tool") or t.get("name")
+                            self.tool_output = out
+                            self.tool_name = t.get("tool") or t.get("name")
                             break
                     elif isinstance(t, str):
-                        tool_output = t
+                        self.tool_output = t
                         # no reliable name in this form
                         break
             elif isinstance(tools_chunk, dict):
                 out = tools_chunk.get("output") or tools_chunk.get("result") or tools_chunk.get("tool_output")
                 if out:
-                    tool_output = out
-                    tool_name = tools_chunk.get("tool") or tools_chunk.get("name")
+                    self.tool_output = out
+                    self.tool_name = tools_chunk.get("tool") or tools_chunk.get("name")
             elif isinstance(tools_chunk, str):
-                tool_output = tools_chunk
+                self.tool_output = tools_chunk
 
         # Also capture the last agent message as conversational fallback
         update = chunk.get("agent")
         if update and update.get("messages"):
             for m in update["messages"]:
                 if isinstance(m, AIMessage):
-                    reply = m.content
+                    # Some providers return a list of content parts; the reply is always text
+                    self.reply = _message_text(m.content)
+                    self.ended_on_tool = False
+
+    def answered_in_text(self, result: str) -> bool:
+        """True when `result` is the model's own text reply, not a product payload or the fallback."""
+        return bool(self.reply) and result == self.reply
+
+    def result(self) -> str:
+        tool_output, reply = self.tool_output, self.reply
+        log.debug("Tool output (%s): %.500s", self.tool_name, tool_output or "")
+
+        # 1) If a tool returned output and it is from product recs or matches schema, return normalized JSON
+        if tool_output:
+            try:
+                data = json.loads(tool_output)
+                if is_product_payload(data):
+                    return json.dumps(normalize_product_payload(data))
+            except (json.JSONDecodeError, TypeError):
+                # Not JSON or not the expected schema; ignore and fall back
+                pass
+
+        # 2) Otherwise, try to extract a product payload from the agent reply (wrapper or markdown)
+        if reply:
+            json_content = reply
+            if "```json" in reply:
+                import re
+                match = re.search(r"```json\s*({.*?})\s*```", reply, re.DOTALL)
+                if match:
+                    json_content = match.group(1)
+            try:
+                data = json.loads(json_content)
+                # Known wrapper keys from tools
+                for key in [
+                    "displayproductrecommendationsresponse",
+                    "display_product_recommendations_response",
+                    "getproductrecommendationsresponse",
+                    "get_product_recommendations_response",
+                ]:
+                    payload = data.get(key)
+                    if is_product_payload(payload):
+                        return json.dumps(normalize_product_payload(payload))
+                # Direct payload in reply
+                if is_product_payload(data):
+                    return json.dumps(normalize_product_payload(data))
+            except (json.JSONDecodeError, TypeError, AttributeError):
+                pass
+
+        # 3) A turn ended by a tool (return_direct) answers with the tool's own text,
+        #    e.g. the "no products found" message; that is also what the history stores
+        if self.ended_on_tool and isinstance(tool_output, str) and tool_output:
+            return tool_output
+
+        # 4) Fallback to conversational text
+        return reply or "عذرًا، لم أتمكن من المساعدة في ذلك."
+
+
+# Helper: validate and normalize product payload
+def is_product_payload(d: Any) -> bool:
+    if not isinstance(d, dict):
+        return False
+    t = d.get("type")
+    if t == "product_recommendations" or t == "productrecommendations":
+        return isinstance(d.get("items"), list)
+    return False
 
-    print(f"\n[DEBUG] TOOL OUTPUT: --------\n{(tool_output or '')[:500]}\n----------------------------------------")
 
-    # Helper: validate and normalize product payload
-    def is_product_payload(d: Any) -> bool:
-        if not isinstance(d, dict):
-            return False
-        t = d.get("type")
-        if t == "product_recommendations" or t == "productrecommendations":
-            return isinstance(d.get("items"), list)
-        return False
+def normalize_product_payload(d: Dict[str, Any]) -> Dict[str, Any]:
+    if d.get("type") == "productrecommendations":
+        d = dict(d)
+        d["type"] = "product_recommendations"
+    return d
+
+
+def _history_cut(messages: List[Any]) -> int:
+    """
+    How many of the oldest messages to drop so at most MAX_MESSAGES_PER_SESSION remain.
+    The cut lands on a user message so tool calls are never split from their results.
+    """
+    if MAX_MESSAGES_PER_SESSION <= 0 or len(messages) <= MAX_MESSAGES_PER_SESSION:
+        return 0
+    for cut in range(len(messages) - MAX_MESSAGES_PER_SESSION, len(messages)):
+        if isinstance(messages[cut], HumanMessage):
+            return cut
+    return 0
+
+
+def _direct_reply(messages: List[Any]) -> List[AIMessage]:
+    """
+    A turn ended by a return_direct tool stops at its ToolMessage; the payload is
+    stored once more as the agent's reply so every turn in the history ends on an
+    AIMessage, the same shape as a turn where the model answered itself.
+    """
+    if messages and isinstance(messages[-1], ToolMessage):
+        return [AIMessage(content=messages[-1].content)]
+    return []
 
-    def normalize_product_payload(d: Dict[str, Any]) -> Dict[str, Any]:
-        if d.get("type") == "productrecommendations":
-            d = dict(d)
-            d["type"] = "product_recommendations"
-        return d
-
-    # 1) If a tool returned output and it is from product recs or matches schema, return normalized JSON
-    if tool_output:
-        try:
-            data = json.loads(tool_output)
-            if is_product_payload(data):
-                return json.dumps(normalize_product_payload(data))
-        except (json.JSONDecodeError, TypeError):
-            # Not JSON or not the expected schema; ignore and fall back
-            pass
-
-    # 2) Otherwise, try to extract a product payload from the agent reply (wrapper or markdown)
+
+def _finish_turn(config: Dict[str, Any]) -> None:
+    messages = graph.get_state(config).values.get("messages", [])
+    reply = _direct_reply(messages)
     if reply:
-        json_content = reply
-        if "```json" in reply:
-            import re
-            match = re.search(r"```json\s*({.*?})\s*```", reply, re.DOTALL)
-            if match:
-                json_content = match.group(1)
-        try:
-            data = json.loads(json_content)
-            # Known wrapper keys from tools
-            for key in [
-                "displayproductrecommendationsresponse",
-                "display_product_recommendations_response",
-                "getproductrecommendationsresponse",
-                "get_product_recommendations_response",
-            ]:
-                payload = data.get(key)
-                if is_product_payload(payload):
-                    return json.dumps(normalize_product_payload(payload))
-            # Direct payload in reply
-            if is_product_payload(data):
-                return json.dumps(normalize_product_payload(data))
-        except (json.JSONDecodeError, TypeError):
-            pass
-
-    # 3) Fallback to conversational text
-    return reply or "عذرًا، لم أتمكن من المساعدة في ذلك."
+        graph.update_state(config, {"messages": reply}, as_node="agent")
+    cut = _history_cut(messages + reply)
+    if cut:
+        graph.update_state(config, {"messages": [RemoveMessage(id=m.id) for m in messages[:cut]]})
 
 
+async def _afinish_turn(config: Dict[str, Any]) -> None:
+    messages = (await graph.aget_state(config)).values.get("messages", [])
+    reply = _direct_reply(messages)
+    if reply:
+        await graph.aupdate_state(config, {"messages": reply}, as_node="agent")
+    cut = _history_cut(messages + reply)
+    if cut:
+        await graph.aupdate_state(config, {"messages": [RemoveMessage(id=m.id) for m in messages[:cut]]})
+    await _aflush_checkpoints()
+
+
+def _unanswered_tool_calls(messages: List[Any]) -> List[ToolMessage]:
+    """A ToolMessage for every tool call in `messages` that has no result yet."""
+    answered = {m.tool_call_id for m in messages if isinstance(m, ToolMessage)}
+    return [
+        ToolMessage(
+            content="The request was interrupted before this tool finished.",
+            tool_call_id=call["id"],
+            name=call["name"],
+        )
+        for m in messages if isinstance(m, AIMessage)
+        for call in m.tool_calls if call["id"] not in answered
+    ]
+
+
+async def _arepair_turn(config: Dict[str, Any], graph_task: Optional[asyncio.Future] = None) -> None:
+    """
+    Close a turn that was cut short (timeout, cancelled request, client gone).
+
+    The checkpointer may already hold the model's tool-call message; a tool call
+    without a ToolMessage makes every later turn on the thread fail, so each
+    unanswered call gets one, then the turn is finished as usual. `graph_task`,
+    if still running, is cancelled and awaited first. Shielded so it completes
+    even if the caller is cancelled again meanwhile.
+    """
+    async def _repair() -> None:
+        if graph_task is not None:
+            graph_task.cancel()
+            await asyncio.gather(graph_task, return_exceptions=True)
+        messages = (await graph.aget_state(config)).values.get("messages", [])
+        missing = _unanswered_tool_calls(messages)
+        if missing:
+            await graph.aupdate_state(config, {"messages": missing}, as_node="tools")
+        await _afinish_turn(config)
+
+    try:
+        await asyncio.shield(_repair())
+    except asyncio.CancelledError:
+        pass  # the repair keeps running; the caller re-raises its own error
+    except Exception as e:
+        log.warning("Could not repair interrupted turn: %s", e)
+
+
+def generate_response(
+    user_msg: str,
+    context: Optional[Dict[str, Any]] = None,
+    session_id: str = CLI_THREAD_ID,
+) -> str:
+    """Blocking entry point (CLI / scripts). Servers should await agenerate_response()."""
+    log.info("New request (session %s)", session_id)
+    config = thread_config(session_id)
+    reply = _fast_path(user_msg, context, config)
+    cacheable = reply is None and _semantic_cache_eligible(context, config)
+    if cacheable:
+        reply = _cached_reply(user_msg, context, config)
+    if reply is not None:
+        _finish_turn(config)
+        return reply
+    collector = _TurnCollector()
+    for chunk in graph.stream(_build_inputs(user_msg, context), stream_mode="updates", config=config):
+        collector.feed(chunk)
+    _finish_turn(config)
+    result = collector.result()
+    if cacheable and collector.answered_in_text(result):
+        semantic_cache.store(user_msg, result)
+    return result
+
+
+async def agenerate_response(
+    user_msg: str,
+    context: Optional[Dict[str, Any]] = None,
+    session_id: str = CLI_THREAD_ID,
+) -> str:
+    """
+    Async twin of generate_response(): drives graph.astream so LLM calls never
+    block the event loop (sync tools run in the default executor).
+    CHAT_TIMEOUT_S bounds the turn.
+
+    An identical message re-sent to the same session while its first copy is
+    still running (double submit, client retry) joins that turn instead of
+    appending a second one to the history. Cancelling one caller leaves the turn
+    running for the others; it is cancelled when no caller is left.
+    """
+    key = (session_id, user_msg, json.dumps(context, sort_keys=True, default=str))
+    return await _turn_flight.do(key, lambda: _arun_turn(user_msg, context, session_id))
+
+
+async def _arun_turn(user_msg: str, context: Optional[Dict[str, Any]], session_id: str) -> str:
+    log.info("New request (session %s)", session_id)
+    config = thread_config(session_id)
+    collector = _TurnCollector()
+    cacheable = False
+
+    async def _run() -> Optional[str]:
+        nonlocal cacheable
+        reply = await _afast_path(user_msg, context, config)
+        if reply is not None:
+            return reply
+        cacheable = await _asemantic_cache_eligible(context, config)
+        if cacheable:
+            reply = await _acached_reply(user_msg, context, config)
+            if reply is not None:
+                return reply
+        async for chunk in graph.astream(_build_inputs(user_msg, context), stream_mode="updates", config=config):
+            collector.feed(chunk)
+        return None
+
+    try:
+        reply = await asyncio.wait_for(_run(), timeout=CHAT_TIMEOUT_S or None)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        await _arepair_turn(config)
+        raise
+    await _afinish_turn(config)
+    if reply is not None:
+        return reply
+    result = collector.result()
+    if cacheable and collector.answered_in_text(result):
+        await asyncio.to_thread(semantic_cache.store, user_msg, result)
+    return result
+
+
+
+def _message_text(content: Any) -> str:
+    """Text of a message/chunk content (plain string or a list of content parts)."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(
+            p if isinstance(p, str) else p.get("text", "")
+            for p in content
+            if isinstance(p, (str, dict))
+        )
+    return ""
+
+
+async def astream_response(
+    user_msg: str,
+    context: Optional[Dict[str, Any]] = None,
+    session_id: str = CLI_THREAD_ID,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream one agent turn as events:
+    - {"event": "token", "data": {"text": ...}}: model text deltas as they arrive
+    - {"event": "products", "data": payload}: as soon as get_product_recommendations returns
+    - {"event": "done", "data": {"reply": ...}}: the same final reply agenerate_response() returns
+
+    get_product_recommendations is return_direct, so its payload ends the turn;
+    model tokens arriving after it (none are expected) are not forwarded.
+    Turns answered by the fast-path router emit only `products` and `done`;
+    semantic-cache hits emit the whole reply as one `token` event.
+    """
+    log.info("New stream request (session %s)", session_id)
+    config = thread_config(session_id)
+    collector = _TurnCollector()
+    products_sent = False
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + CHAT_TIMEOUT_S if CHAT_TIMEOUT_S else None
+
+    def _remaining() -> Optional[float]:
+        return None if deadline is None else max(0.0, deadline - loop.time())
+
+    async def _prelude() -> tuple:
+        reply = await _afast_path(user_msg, context, config)
+        if reply is not None:
+            return reply, True, False
+        cacheable = await _asemantic_cache_eligible(context, config)
+        if cacheable:
+            reply = await _acached_reply(user_msg, context, config)
+        return reply, False, cacheable
+
+    reply, routed, cacheable = await asyncio.wait_for(_prelude(), timeout=_remaining())
+    if reply is not None:
+        await _afinish_turn(config)
+        if routed:
+            yield {"event": "products", "data": json.loads(reply)}
+        else:
+            yield {"event": "token", "data": {"text": reply}}
+        yield {"event": "done", "data": {"reply": reply}}
+        return
+
+    # The graph runs in its own task, bounded by wait_for, and hands its chunks over
+    # a queue; events are yielded from here, so a slow client never holds the graph.
+    chunks: asyncio.Queue = asyncio.Queue()
+    end = object()
+
+    async def _produce() -> None:
+        async for item in graph.astream(
+            _build_inputs(user_msg, context),
+            stream_mode=["messages", "updates"],
+            config=config,
+        ):
+            chunks.put_nowait(item)
+
+    producer = asyncio.ensure_future(asyncio.wait_for(_produce(), timeout=_remaining()))
+    producer.add_done_callback(lambda _: chunks.put_nowait(end))
+    try:
+        while True:
+            item = await chunks.get()
+            if item is end:
+                break
+            mode, chunk = item
+            if mode == "messages":
+                msg, metadata = chunk
+                if products_sent or metadata.get("langgraph_node") != "agent":
+                    continue
+                # token deltas (AIMessageChunk) or whole messages from non-streaming models
+                if isinstance(msg, AIMessage) and not (msg.tool_calls or getattr(msg, "tool_call_chunks", None)):
+                    text = _message_text(msg.content)
+                    if text:
+                        yield {"event": "token", "data": {"text": text}}
+                continue
+
+            collector.feed(chunk)
+            if not products_sent and collector.tool_output:
+                try:
+                    data = json.loads(collector.tool_output)
+                except (json.JSONDecodeError, TypeError):
+                    continue
+                if is_product_payload(data):
+                    products_sent = True
+                    yield {"event": "products", "data": normalize_product_payload(data)}
+        await producer  # re-raises TimeoutError and graph errors
+    except (asyncio.TimeoutError, asyncio.CancelledError, GeneratorExit):
+        # timed out, or the client went away (the server cancels / closes the stream)
+        await _arepair_turn(config, producer)
+        raise
+    finally:
+        producer.cancel()
+
+    await _afinish_turn(config)
+    result = collector.result()
+    if cacheable and collector.answered_in_text(result):
+        await asyncio.to_thread(semantic_cache.store, user_msg, result)
+    yield {"event": "done", "data": {"reply": result}}
 
 
 # ═════════════ 8. CLI FOR QUICK TESTS (unchanged) ════════
 
 if __name__ == "__main__":
+    from log_setup import setup_logging
+    setup_logging()
     while True:
         text = input("User: ")
         if text.lower() in {"exit", "quit", "q"}:
@@ -3,19 +3,50 @@ FastAPI wrapper exposing /chat for the browser extension.
 Run with:  uvicorn app:app --reload
 """
 
-# testing time
+import logging
 import time
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+import asyncio
+import json
+import uuid
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
-from agent_core import generate_response
+from agent_core import agenerate_response, astream_response, setup_checkpointer, close_checkpointer, acheckpointer_stats
+from metrics import REQUEST_SECONDS, refresh_session_stats
+from tools import warmup
+from batch import run_batch, BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY
+from log_setup import setup_logging
+
+# Levels/format from JARIR_LOG_LEVEL / JARIR_LOG_FORMAT; records are written by a background thread
+setup_logging()
+log = logging.getLogger(__name__)
 
 class ChatReq(BaseModel):
     message: str
     context: dict | None = None
+    # Conversation to continue; omitted → a new session whose id is returned
+    session_id: str | None = None
+
+    def resolved_session_id(self) -> str:
+        return self.session_id or uuid.uuid4().hex
+
+class BatchReq(BaseModel):
+    items: list[ChatReq]
+    concurrency: int | None = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Preload the configured catalogs in the background; the rest load on first use
+    warmup(background=True)
+    await setup_checkpointer()
+    yield
+    await close_checkpointer()
 
-app = FastAPI(title="Jarir-AI Backend", version="0.1")
+app = FastAPI(title="Jarir-AI Backend", version="0.1", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -24,7 +55,76 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    # for /chat/stream this is time to first byte; the turn itself shows in the LLM/tool histograms
+    started = time.perf_counter()
+    status = "500"
+    try:
+        response = await call_next(request)
+        status = str(response.status_code)
+        return response
+    finally:
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", "unmatched")
+        REQUEST_SECONDS.labels(endpoint, status).observe(time.perf_counter() - started)
+
+@app.get("/metrics")
+async def metrics():
+    refresh_session_stats(await acheckpointer_stats())
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.post("/chat")
 async def chat(req: ChatReq):
-    answer = generate_response(req.message, req.context)
-    return {"reply": answer}
+    # Awaited: LLM calls run on the loop asynchronously, tools in the thread pool
+    session_id = req.resolved_session_id()
+    try:
+        answer = await agenerate_response(req.message, req.context, session_id=session_id)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="The assistant took too long to answer.")
+    return {"reply": answer, "session_id": session_id}
+
+
+@app.post("/chat/batch")
+async def chat_batch(req: BatchReq):
+    """
+    Answer many messages in one call. Items with the same session_id run in
+    order as one conversation; sessions run concurrently (bounded). Returns
+    per-item replies and timings plus a summary.
+    """
+    concurrency = min(req.concurrency or BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    items = [item.model_dump() for item in req.items]
+    return await run_batch(items, concurrency=concurrency)
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatReq):
+    """
+    Server-sent events version of /chat: `token` events carry text deltas,
+    `products` the recommendation payload as soon as it exists, and `done`
+    the final reply (identical to /chat's) plus the session id. Failures arrive
+    as an `error` event.
+    """
+    session_id = req.resolved_session_id()
+
+    async def events():
+        try:
+            async for ev in astream_response(req.message, req.context, session_id=session_id):
+                data = ev["data"]
+                if ev["event"] == "done":
+                    data = {**data, "session_id": session_id}
+                yield _sse(ev["event"], data)
+        except asyncio.TimeoutError:
+            yield _sse("error", {"detail": "The assistant took too long to answer."})
+        except Exception as e:
+            log.exception("/chat/stream failed: %s", e)
+            yield _sse("error", {"detail": "Something went wrong while answering."})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,141 @@
+"""
+Bulk replay of shopper messages through the agent (offline evaluation, nightly runs).
+
+Items sharing a session_id form one conversation and run in order; different
+sessions run concurrently, at most `concurrency` turns at a time. Everything
+runs in this process, so catalogs, embedding models and caches are shared.
+
+CLI:
+    python batch.py queries.jsonl [-o results.jsonl] [-c 8]
+
+Each input line is {"message": ..., "session_id": ... (optional), "context": ... (optional)}.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from agent_core import agenerate_response
+from log_setup import setup_logging
+from timing import percentile
+
+# Turns run at once when the caller does not say otherwise, and the cap for /chat/batch
+BATCH_CONCURRENCY = int(os.getenv("JARIR_BATCH_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("JARIR_BATCH_MAX_CONCURRENCY", "32"))
+
+
+async def run_batch(items: List[Dict[str, Any]], concurrency: int = BATCH_CONCURRENCY) -> Dict[str, Any]:
+    """
+    Answer every item and return {"results": [...], "summary": {...}}.
+
+    Parameters:
+    - items: dicts with "message" and optional "session_id" / "context";
+      items without a session_id each get a fresh session.
+    - concurrency: maximum number of turns in flight.
+
+    Results keep the input order; each has index, session_id, ok, reply, error
+    and elapsed_ms. A failing item is reported and does not stop the batch.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+
+    conversations: Dict[str, List[int]] = {}
+    for i, item in enumerate(items):
+        session_id = item.get("session_id") or uuid.uuid4().hex
+        conversations.setdefault(session_id, []).append(i)
+
+    async def _run_one(i: int, session_id: str) -> None:
+        item = items[i]
+        async with semaphore:
+            started = time.perf_counter()
+            reply, error = None, None
+            try:
+                reply = await agenerate_response(item["message"], item.get("context"), session_id=session_id)
+            except asyncio.TimeoutError:
+                error = "timeout"
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            elapsed_ms = 1000 * (time.perf_counter() - started)
+        results[i] = {
+            "index": i,
+            "session_id": session_id,
+            "ok": error is None,
+            "reply": reply,
+            "error": error,
+            "elapsed_ms": round(elapsed_ms, 1),
+        }
+
+    async def _run_conversation(session_id: str, indexes: List[int]) -> None:
+        for i in indexes:
+            await _run_one(i, session_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(_run_conversation(sid, idx) for sid, idx in conversations.items()))
+    wall_s = time.perf_counter() - started
+
+    latencies = sorted(r["elapsed_ms"] for r in results)
+    failed = sum(1 for r in results if not r["ok"])
+    summary = {
+        "items": len(items),
+        "sessions": len(conversations),
+        "ok": len(items) - failed,
+        "failed": failed,
+        "concurrency": concurrency,
+        "wall_ms": round(1000 * wall_s, 1),
+        "items_per_s": round(len(items) / wall_s, 2) if wall_s > 0 else 0.0,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "max_ms": latencies[-1] if latencies else 0.0,
+    }
+    return {"results": results, "summary": summary}
+
+
+def _read_items(path: str) -> List[Dict[str, Any]]:
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if not item.get("message"):
+                raise ValueError(f"{path}:{line_no}: missing 'message'")
+            items.append(item)
+    return items
+
+
+async def _main(args: argparse.Namespace) -> None:
+    from agent_core import setup_checkpointer, close_checkpointer
+    from tools import warmup
+
+    items = _read_items(args.input)
+    warmup(background=False)
+    await setup_checkpointer()
+    try:
+        out = await run_batch(items, concurrency=args.concurrency)
+    finally:
+        await close_checkpointer()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for r in out["results"]:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    else:
+        for r in out["results"]:
+            print(json.dumps(r, ensure_ascii=False))
+    print(json.dumps(out["summary"]), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a JSONL file of shopper messages through the agent.")
+    parser.add_argument("input", help="JSONL file, one {message, session_id?, context?} per line")
+    parser.add_argument("-o", "--output", help="write per-item results here (JSONL) instead of stdout")
+    parser.add_argument("-c", "--concurrency", type=int, default=BATCH_CONCURRENCY)
+    # logs go to stderr, so stdout stays clean JSONL
+    setup_logging()
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,370 @@
+"""
+Micro-benchmarks for the search / consolidation hot paths.
+
+Covers exact_search_catalog, _map_raw_product_to_card, consolidate_products, the
+variant-family lookup (get_family_cards),
+build_brand_first_map and create_catalog_index on the real data/*.csv files and
+on synthetic catalogs made by repeating their rows 10×, 100× and 1000×.
+Each case reports p50/p99 latency and tracemalloc peak/net allocation per call,
+plus ref_ms: the p50 of a small fixed reference workload timed right after every
+call, i.e. how fast the machine was while the case ran. With --runs N the suite
+runs N times and each case keeps its median run (see merge_runs).
+
+Run from backend/:
+    python benchmarks/bench_hotpaths.py                      # all catalogs, scales 1,10,100,1000
+    python benchmarks/bench_hotpaths.py --scales 1,10 --catalogs laptops
+    python benchmarks/bench_hotpaths.py --save benchmarks/baseline.json
+    python benchmarks/bench_hotpaths.py --compare benchmarks/baseline.json   # exit 1 on regression
+
+A case regresses when it is slower (or allocates more) than the baseline by more
+than --threshold and by more than the absolute floor (--min-delta-ms /
+--min-delta-kib), so sub-millisecond cases do not fail on run-to-run noise.
+Each baseline latency is first scaled by the case's ref_ms now / in the baseline,
+so a machine that is slower or busier than when the baseline was saved (CPU
+contention on shared hosts easily doubles sub-millisecond timings) does not flag
+every case.
+The committed benchmarks/baseline.json was saved with --cold-max-rows 0; re-save
+it (on the machine that runs --compare) when a change is meant to move the numbers.
+
+create_catalog_index is timed warm (embeddings served from the on-disk cache, so it
+measures CSV parsing and the exact-search structures); the cold variant encodes
+every row and only runs for catalogs up to --cold-max-rows rows. Synthetic
+catalogs get their cache seeded with the 1× embeddings tiled.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd
+
+import faiss
+import numpy as np
+
+from dbSearch import EXACT_SEARCH_KEYS, create_catalog_index, exact_search_catalog, get_family_cards, get_rows_by_ids
+from dbSearch import _save_cached_index, catalog_cache_key
+from log_setup import setup_logging
+import tools
+from tools import CATALOG_SOURCES, _map_raw_product_to_card, build_brand_first_map, consolidate_products
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+
+_DEVNULL = open(os.devnull, "w")
+
+
+def _quiet():
+    # keep anything the code under test writes to stdout off the report
+    return contextlib.redirect_stdout(_DEVNULL)
+
+
+_REF_FRAME = pd.DataFrame({
+    "brand": ["HP", "Lenovo", "Apple", "Asus"] * 15,
+    "ram": [str(4 * (i % 16 + 1)) for i in range(60)],
+})
+
+
+def _reference() -> int:
+    # the same kind of work as the cases (pandas → records, str handling), small and fixed
+    rows = _REF_FRAME.to_dict("records")
+    return sum(len(str(r["brand"]).strip().lower() + r["ram"]) for r in rows)
+
+
+def measure(fn: Callable[[], Any], repeat: int, alloc_repeat: int = 3) -> Dict[str, float]:
+    """
+    Time `repeat` calls of fn, each followed by a timed _reference() call, then trace
+    `alloc_repeat` more with tracemalloc. Returns p50/p99/mean in ms, ref_ms (p50 of
+    the reference calls) and peak/net KiB per call (max over the traced calls).
+    """
+    times = []
+    ref_times = []
+    with _quiet():
+        try:
+            fn()  # warm-up
+            _reference()
+        except Exception as e:
+            # reported instead of aborting the run, so one broken path does not hide the others
+            return {"error": f"{type(e).__name__}: {e}"}
+        for _ in range(repeat):
+            t0 = time.perf_counter_ns()
+            fn()
+            t1 = time.perf_counter_ns()
+            _reference()
+            times.append((t1 - t0) / 1e6)
+            ref_times.append((time.perf_counter_ns() - t1) / 1e6)
+
+        peak_kib = net_kib = 0.0
+        tracemalloc.start()
+        try:
+            for _ in range(alloc_repeat):
+                tracemalloc.reset_peak()
+                base, _ = tracemalloc.get_traced_memory()
+                result = fn()
+                current, peak = tracemalloc.get_traced_memory()
+                peak_kib = max(peak_kib, (peak - base) / 1024)
+                net_kib = max(net_kib, (current - base) / 1024)
+                del result
+        finally:
+            tracemalloc.stop()
+
+    times.sort()
+    return {
+        "calls": repeat,
+        "p50_ms": round(statistics.median(times), 4),
+        "p99_ms": round(times[min(len(times) - 1, int(0.99 * len(times)))], 4),
+        "mean_ms": round(statistics.fmean(times), 4),
+        "ref_ms": round(statistics.median(ref_times), 4),
+        "peak_kib": round(peak_kib, 1),
+        "net_kib": round(net_kib, 1),
+    }
+
+
+def scaled_csv(src: Path, scale: int, workdir: Path) -> Path:
+    """Write `src` repeated `scale` times (sku/model made unique per copy) and return its path."""
+    if scale == 1:
+        return src
+    out = workdir / f"{src.stem}_x{scale}.csv"
+    if out.exists():
+        return out
+    df = pd.read_csv(src)
+    copies = []
+    for i in range(scale):
+        part = df.copy()
+        if i:
+            # new model names per copy so the vocabulary grows with the catalog, like a real one would
+            part["model"] = part["model"].astype(str) + f" {i}"
+            if "sku" in part.columns:
+                part["sku"] = part["sku"].astype(str) + f"-{i}"
+        copies.append(part)
+    pd.concat(copies, ignore_index=True).to_csv(out, index=False)
+    return out
+
+
+def seed_index_cache(name: str, scaled_path: Path, cache_dir: Path) -> None:
+    """
+    Pre-fill the embedding cache of a synthetic catalog with the 1× embeddings tiled,
+    so the warm benchmark does not have to encode hundreds of thousands of rows first.
+    """
+    src, spec_columns = CATALOG_SOURCES[name]
+    with _quiet():
+        base = create_catalog_index(str(src), spec_columns, tools.EMBEDDING_MODEL, cache_dir=str(cache_dir))
+    n_rows = len(pd.read_csv(scaled_path, usecols=["brand"]))
+    embeddings = np.tile(base["embeddings"], (n_rows // len(base["embeddings"]), 1))
+    index = faiss.IndexFlatIP(embeddings.shape[1])
+    index.add(embeddings)
+    key = catalog_cache_key(str(scaled_path), spec_columns, tools.EMBEDDING_MODEL)
+    _save_cached_index(cache_dir / key, embeddings, index, {"csv_path": str(scaled_path), "rows": n_rows})
+
+
+def sample_queries(catalog: Dict[str, Any], n: int, seed: int = 0) -> List[Dict[str, str]]:
+    """Spec dicts shaped like the agent's: brand, brand+model, +ram, and full specs with one miss."""
+    rng = random.Random(seed)
+    records = catalog["records"]
+    keys = [k for k in EXACT_SEARCH_KEYS if k in catalog["df"].columns]
+    queries = []
+    for i in range(n):
+        row = records[rng.randrange(len(records))]
+        width = (1, 2, 3, len(keys))[i % 4]
+        q = {k: str(row[k]) for k in keys[:width] if pd.notna(row.get(k))}
+        if width == len(keys) and "storage" in q:
+            q["storage"] = "9 TB SSD"  # forces the drop-one pass
+        queries.append(q or {"brand": str(row["brand"])})
+    return queries
+
+
+def bench_catalog(name: str, scale: int, workdir: Path, args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    src, spec_columns = CATALOG_SOURCES[name]
+    path = scaled_csv(Path(src), scale, workdir)
+    rows = scale * len(pd.read_csv(src, usecols=["brand"]))
+    label = f"{name}[x{scale}]"
+    # fewer repetitions for the big catalogs so a full run stays in minutes
+    reps = max(3, args.repeat // scale) if scale > 1 else args.repeat
+    results: Dict[str, Dict[str, float]] = {}
+    cache_dir = workdir / "index_cache"
+
+    if rows <= args.cold_max_rows:
+        results[f"create_catalog_index.cold/{label}"] = measure(
+            lambda: create_catalog_index(str(path), spec_columns, tools.EMBEDDING_MODEL, cache_dir=None),
+            repeat=max(1, min(reps, 5)), alloc_repeat=1,
+        )
+
+    if scale > 1:
+        seed_index_cache(name, path, cache_dir)
+    with _quiet():
+        catalog = create_catalog_index(str(path), spec_columns, tools.EMBEDDING_MODEL, cache_dir=str(cache_dir))
+    results[f"create_catalog_index.warm/{label}"] = measure(
+        lambda: create_catalog_index(str(path), spec_columns, tools.EMBEDDING_MODEL, cache_dir=str(cache_dir)),
+        repeat=max(1, min(reps, 10)), alloc_repeat=1,
+    )
+
+    queries = sample_queries(catalog, 64)
+    it = iter(range(10**9))
+    results[f"exact_search_catalog/{label}"] = measure(
+        lambda: exact_search_catalog(queries[next(it) % len(queries)], catalog), repeat=args.repeat * 4,
+    )
+
+    sample = [catalog["records"][i] for i in random.Random(1).sample(range(len(catalog["records"])), 20)]
+    results[f"_map_raw_product_to_card/{label}"] = measure(
+        lambda: [_map_raw_product_to_card(dict(r)) for r in sample], repeat=args.repeat,
+    )
+
+    # consolidate the rows a typical search returns (top 20 of a brand query)
+    hits = exact_search_catalog({"brand": str(catalog["records"][0]["brand"])}, catalog)
+    raw = {"results": get_rows_by_ids(catalog, [h["id"] for h in hits])}
+    results[f"consolidate_products/{label}"] = measure(lambda: consolidate_products.func(raw), repeat=args.repeat)
+    # the same query the way get_product_recommendations runs it: one hit per family, then the lookup
+    family_hits = exact_search_catalog({"brand": str(catalog["records"][0]["brand"])}, catalog, one_per_family=True)
+    family_ids = [h["id"] for h in family_hits]
+    results[f"get_family_cards/{label}"] = measure(lambda: get_family_cards(catalog, family_ids), repeat=args.repeat)
+    return results
+
+
+def bench_brand_map(scale: int, workdir: Path, args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    paths = [scaled_csv(Path(p), scale, workdir) for p in dict.fromkeys(str(s) for s in tools.csv_paths)]
+    reps = max(3, args.repeat // (10 * scale))
+    return {f"build_brand_first_map/all[x{scale}]": measure(lambda: build_brand_first_map(paths), repeat=reps, alloc_repeat=1)}
+
+
+def _report_line(case: str, r: Dict[str, Any]) -> str:
+    if "error" in r:
+        return f"{case:58} FAILED  {r['error']}"
+    return (f"{case:58} p50 {r['p50_ms']:>10.3f} ms  p99 {r['p99_ms']:>10.3f} ms  "
+            f"ref {r['ref_ms']:>7.3f} ms  peak {r['peak_kib']:>10.1f} KiB  net {r['net_kib']:>10.1f} KiB")
+
+
+def merge_runs(runs: List[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Per case, the run with the median p50 relative to its ref_ms (its latencies stay
+    paired with the machine speed they were measured at) and the median allocations.
+    A failure in any run is kept.
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for case in runs[0]:
+        per_run = [r[case] for r in runs if case in r]
+        failed = next((r for r in per_run if "error" in r), None)
+        if failed is not None:
+            merged[case] = failed
+            continue
+        per_run.sort(key=lambda r: r["p50_ms"] / r["ref_ms"] if r["ref_ms"] > 0 else r["p50_ms"])
+        merged[case] = dict(per_run[len(per_run) // 2])
+        for k in ("peak_kib", "net_kib"):
+            merged[case][k] = round(statistics.median(r[k] for r in per_run), 1)
+    return merged
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline_path: Path,
+    threshold: float,
+    min_delta_ms: float,
+    min_delta_kib: float,
+) -> int:
+    baseline = json.loads(baseline_path.read_text())["results"]
+    regressions = 0
+    print(f"\n{'case':58} {'p50 base→now (ms)':>24} {'peak base→now (KiB)':>26}  (base scaled to the current ref_ms)")
+    for case, now in results.items():
+        base = baseline.get(case)
+        if base is None or "error" in base:
+            print(f"{case:58} {'(no baseline)':>24}")
+            continue
+        if "error" in now:
+            regressions += 1
+            print(f"{case:58} FAILED  {now['error']}")
+            continue
+        flags = []
+        speed = now["ref_ms"] / base["ref_ms"] if base.get("ref_ms") else 1.0
+        base_p50 = base["p50_ms"] * speed
+        if now["p50_ms"] > base_p50 * (1 + threshold) and now["p50_ms"] - base_p50 > min_delta_ms:
+            flags.append("SLOWER")
+        if now["peak_kib"] > base["peak_kib"] * (1 + threshold) and now["peak_kib"] - base["peak_kib"] > min_delta_kib:
+            flags.append("MORE MEMORY")
+        regressions += bool(flags)
+        print(
+            f"{case:58} {base_p50:>10.3f} → {now['p50_ms']:<10.3f} "
+            f"{base['peak_kib']:>11.1f} → {now['peak_kib']:<11.1f} {' '.join(flags)}"
+        )
+    print(f"\n{regressions} regression(s) over {threshold:.0%} (and {min_delta_ms} ms / {min_delta_kib} KiB) "
+          f"against {baseline_path}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--catalogs", default=",".join(n for n in CATALOG_SOURCES if n != "desktops"),
+                        help="comma-separated catalog names (desktops shares aio's CSV)")
+    parser.add_argument("--scales", default="1,10,100,1000")
+    parser.add_argument("--repeat", type=int, default=200, help="timed calls per case at scale 1")
+    parser.add_argument("--cold-max-rows", type=int, default=5000,
+                        help="only re-encode catalogs up to this many rows for create_catalog_index.cold")
+    parser.add_argument("--save", nargs="?", const=str(DEFAULT_BASELINE), help="write results as a baseline JSON")
+    parser.add_argument("--compare", nargs="?", const=str(DEFAULT_BASELINE), help="compare against a baseline JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown counted as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=0.1,
+                        help="p50 increases up to this many ms are never a regression")
+    parser.add_argument("--min-delta-kib", type=float, default=64.0,
+                        help="peak allocation increases up to this many KiB are never a regression")
+    parser.add_argument("--runs", type=int, default=3, help="run the suite this many times (see merge_runs)")
+    args = parser.parse_args()
+    # same pipeline and level (JARIR_LOG_LEVEL) as the server, so logging cost is part of the numbers
+    setup_logging()
+
+    catalogs = [c.strip() for c in args.catalogs.split(",") if c.strip()]
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+    runs: List[Dict[str, Dict[str, Any]]] = []
+
+    with tempfile.TemporaryDirectory(prefix="jarir-bench-") as tmp:
+        workdir = Path(tmp)
+        for run in range(max(1, args.runs)):
+            print(f"--- run {run + 1}/{max(1, args.runs)}", flush=True)
+            results: Dict[str, Dict[str, Any]] = {}
+            for scale in scales:
+                for name in catalogs:
+                    for case, r in bench_catalog(name, scale, workdir, args).items():
+                        results[case] = r
+                        print(_report_line(case, r), flush=True)
+                for case, r in bench_brand_map(scale, workdir, args).items():
+                    results[case] = r
+                    print(_report_line(case, r), flush=True)
+            runs.append(results)
+
+    results = merge_runs(runs)
+    if len(runs) > 1:
+        print(f"\n--- median of {len(runs)} runs")
+        for case, r in results.items():
+            print(_report_line(case, r))
+
+    if args.save:
+        Path(args.save).write_text(json.dumps({
+            "meta": {
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "pandas": pd.__version__,
+                "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "runs": len(runs),
+                "repeat": args.repeat,
+                "scales": scales,
+                "cold_max_rows": args.cold_max_rows,
+            },
+            "results": results,
+        }, indent=2))
+        print(f"\nbaseline written to {args.save}")
+    if args.compare:
+        regressions = compare(results, Path(args.compare), args.threshold, args.min_delta_ms, args.min_delta_kib)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
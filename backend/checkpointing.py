@@ -0,0 +1,338 @@
+"""
+Conversation checkpointers for the agent graph.
+
+BoundedInMemorySaver is LangGraph's InMemorySaver with limits, so a worker's
+memory stays flat under sustained traffic:
+- only the newest `keep_checkpoints` checkpoints per thread are retained
+  (InMemorySaver otherwise keeps one per graph step, forever)
+- threads idle for longer than `ttl` seconds are dropped
+- at most `max_threads` threads are kept, least recently used evicted first
+
+DurableSqliteSaver keeps conversations in a local SQLite file (WAL mode) so
+every uvicorn worker on the host sees every session; see its docstring.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Set, Tuple
+
+import aiosqlite
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+log = logging.getLogger(__name__)
+
+
+class BoundedInMemorySaver(InMemorySaver):
+    def __init__(
+        self,
+        max_threads: int = 1000,
+        ttl: Optional[float] = 3600.0,
+        keep_checkpoints: int = 2,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self.ttl = ttl or None
+        self.keep_checkpoints = max(1, keep_checkpoints)
+        self.evicted_threads = 0
+        self._lock = threading.RLock()
+        # thread_id → last access (monotonic), oldest first
+        self._last_access: "OrderedDict[str, float]" = OrderedDict()
+        # per-thread key indexes so pruning never scans other threads' data
+        self._blob_keys: Dict[str, Set[Tuple]] = {}
+        self._write_keys: Dict[str, Set[Tuple]] = {}
+
+    # ── access tracking / eviction ───────────────────────────
+    def _touch(self, thread_id: str) -> None:
+        self._last_access[thread_id] = time.monotonic()
+        self._last_access.move_to_end(thread_id)
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        while self._last_access:
+            thread_id, last = next(iter(self._last_access.items()))
+            expired = self.ttl is not None and now - last > self.ttl
+            if not expired and len(self._last_access) <= self.max_threads:
+                break
+            self._drop_thread(thread_id)
+            self.evicted_threads += 1
+
+    def _drop_thread(self, thread_id: str) -> None:
+        self._last_access.pop(thread_id, None)
+        self.storage.pop(thread_id, None)
+        for key in self._write_keys.pop(thread_id, set()):
+            self.writes.pop(key, None)
+        for key in self._blob_keys.pop(thread_id, set()):
+            self.blobs.pop(key, None)
+
+    def _prune_thread(self, thread_id: str, checkpoint_ns: str) -> None:
+        """Drop all but the newest checkpoints of one namespace, plus their writes and blobs."""
+        checkpoints = self.storage.get(thread_id, {}).get(checkpoint_ns)
+        if not checkpoints or len(checkpoints) <= self.keep_checkpoints:
+            return
+        # checkpoint ids are time-ordered (uuid6), so sorting gives age order
+        ordered = sorted(checkpoints)
+        for checkpoint_id in ordered[:-self.keep_checkpoints]:
+            del checkpoints[checkpoint_id]
+            key = (thread_id, checkpoint_ns, checkpoint_id)
+            self.writes.pop(key, None)
+            self._write_keys.get(thread_id, set()).discard(key)
+
+        # keep only the channel blobs the remaining checkpoints still point at
+        live: Set[Tuple] = set()
+        for saved in checkpoints.values():
+            checkpoint = self.serde.loads_typed(saved[0])
+            for channel, version in checkpoint.get("channel_versions", {}).items():
+                live.add((thread_id, checkpoint_ns, channel, version))
+        thread_blobs = self._blob_keys.get(thread_id, set())
+        for key in [k for k in thread_blobs if k[1] == checkpoint_ns and k not in live]:
+            self.blobs.pop(key, None)
+            thread_blobs.discard(key)
+
+    # ── InMemorySaver overrides ──────────────────────────────
+    def get_tuple(self, config):
+        with self._lock:
+            thread_id = config["configurable"]["thread_id"]
+            if thread_id in self._last_access:
+                self._touch(thread_id)
+            return super().get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        with self._lock:
+            items = list(super().list(config, filter=filter, before=before, limit=limit))
+        return iter(items)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with self._lock:
+            thread_id = config["configurable"]["thread_id"]
+            checkpoint_ns = config["configurable"]["checkpoint_ns"]
+            result = super().put(config, checkpoint, metadata, new_versions)
+            self._blob_keys.setdefault(thread_id, set()).update(
+                (thread_id, checkpoint_ns, k, v) for k, v in new_versions.items()
+            )
+            self._touch(thread_id)
+            self._prune_thread(thread_id, checkpoint_ns)
+            self._evict()
+            return result
+
+    def put_writes(self, config, writes: Sequence[Tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        with self._lock:
+            super().put_writes(config, writes, task_id, task_path)
+            cfg = config["configurable"]
+            thread_id = cfg["thread_id"]
+            self._write_keys.setdefault(thread_id, set()).add(
+                (thread_id, cfg.get("checkpoint_ns", ""), cfg["checkpoint_id"])
+            )
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._drop_thread(thread_id)
+
+    # ── accounting ───────────────────────────────────────────
+    def memory_bytes(self) -> int:
+        """Approximate bytes held: serialized checkpoints, metadata, writes and blobs."""
+        with self._lock:
+            total = 0
+            for namespaces in self.storage.values():
+                for checkpoints in namespaces.values():
+                    for cp, md, _parent in checkpoints.values():
+                        total += len(cp[1]) + len(md[1])
+            for inner in self.writes.values():
+                for entry in inner.values():
+                    total += len(entry[2][1])
+            for _type, data in self.blobs.values():
+                total += len(data)
+            return total
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "threads": len(self._last_access),
+                "max_threads": self.max_threads,
+                "evicted_threads": self.evicted_threads,
+                "bytes": self.memory_bytes(),
+            }
+
+
+class _GroupCommitConnection:
+    """
+    aiosqlite connection proxy whose commit() only marks the transaction dirty;
+    a single real COMMIT follows `interval` seconds later (or on flush()), so the
+    several inserts of one graph step share one fsync.
+    """
+
+    def __init__(self, conn: aiosqlite.Connection, interval: float):
+        self._conn = conn
+        self._interval = interval
+        self._dirty = False
+        self._pending: Optional[asyncio.Task] = None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._conn, name)
+
+    async def commit(self) -> None:
+        self._dirty = True
+        if self._interval <= 0:
+            await self.flush()
+        elif self._pending is None or self._pending.done():
+            self._pending = asyncio.get_running_loop().create_task(self._delayed_flush())
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(self._interval)
+        await self.flush()
+
+    async def flush(self) -> None:
+        if self._dirty or self._conn.in_transaction:
+            self._dirty = False
+            await self._conn.commit()
+
+    async def cancel_pending(self) -> None:
+        """Drop the scheduled delayed commit; a following flush() commits its writes."""
+        task, self._pending = self._pending, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+class DurableSqliteSaver(AsyncSqliteSaver):
+    """
+    AsyncSqliteSaver on a local SQLite database in WAL mode, shared by all workers.
+
+    - writes are group-committed every `commit_interval` seconds; aflush() forces
+      the commit (agent_core calls it at the end of every turn, so the next turn
+      sees the history whichever worker serves it)
+    - acompact() keeps the newest `keep_checkpoints` checkpoints per thread, drops
+      threads idle for longer than `ttl` seconds and truncates the WAL;
+      start_compaction() runs it every `compact_interval` seconds
+
+    Create it with `await DurableSqliteSaver.open(path)` from inside the event loop.
+    """
+
+    def __init__(
+        self,
+        conn: aiosqlite.Connection,
+        *,
+        commit_interval: float = 0.05,
+        keep_checkpoints: int = 2,
+        ttl: Optional[float] = 7 * 24 * 3600.0,
+        **kwargs: Any,
+    ):
+        self._batched = _GroupCommitConnection(conn, commit_interval)
+        super().__init__(self._batched, **kwargs)  # type: ignore[arg-type]
+        self.keep_checkpoints = max(1, keep_checkpoints)
+        self.ttl = ttl or None
+        self._compactor: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def open(cls, path: str, **kwargs: Any) -> "DurableSqliteSaver":
+        conn = await aiosqlite.connect(path, timeout=30)
+        # WAL: readers never block the writer; NORMAL sync is durable at WAL checkpoints
+        await conn.execute("PRAGMA journal_mode=WAL")
+        await conn.execute("PRAGMA synchronous=NORMAL")
+        await conn.execute("PRAGMA busy_timeout=30000")
+        saver = cls(conn, **kwargs)
+        await saver.setup()
+        return saver
+
+    async def setup(self) -> None:
+        await super().setup()
+        await self._batched.execute(
+            "CREATE TABLE IF NOT EXISTS thread_activity ("
+            "thread_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+        )
+        await self._batched.flush()
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        result = await super().aput(config, checkpoint, metadata, new_versions)
+        async with self.lock:
+            await self._batched.execute(
+                "INSERT INTO thread_activity (thread_id, updated_at) VALUES (?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (str(config["configurable"]["thread_id"]), time.time()),
+            )
+            await self._batched.commit()
+        return result
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await super().adelete_thread(thread_id)
+        async with self.lock:
+            await self._batched.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+            await self._batched.commit()
+
+    async def aflush(self) -> None:
+        """Commit pending writes now."""
+        async with self.lock:
+            await self._batched.flush()
+
+    async def acompact(self) -> Dict[str, int]:
+        """Prune old checkpoints, orphaned writes and idle threads; returns rows deleted per kind."""
+        await self.setup()
+        deleted: Dict[str, int] = {}
+        async with self.lock:
+            if self.ttl is not None:
+                cutoff = time.time() - self.ttl
+                for table in ("checkpoints", "writes"):
+                    cur = await self._batched.execute(
+                        f"DELETE FROM {table} WHERE thread_id IN "
+                        "(SELECT thread_id FROM thread_activity WHERE updated_at < ?)",
+                        (cutoff,),
+                    )
+                    deleted[f"idle_{table}"] = cur.rowcount
+                cur = await self._batched.execute("DELETE FROM thread_activity WHERE updated_at < ?", (cutoff,))
+                deleted["idle_threads"] = cur.rowcount
+
+            cur = await self._batched.execute(
+                "DELETE FROM checkpoints WHERE (thread_id, checkpoint_ns, checkpoint_id) IN ("
+                "  SELECT thread_id, checkpoint_ns, checkpoint_id FROM ("
+                "    SELECT thread_id, checkpoint_ns, checkpoint_id, ROW_NUMBER() OVER ("
+                "      PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC) AS rn"
+                "    FROM checkpoints)"
+                "  WHERE rn > ?)",
+                (self.keep_checkpoints,),
+            )
+            deleted["old_checkpoints"] = cur.rowcount
+            cur = await self._batched.execute(
+                "DELETE FROM writes WHERE NOT EXISTS ("
+                "  SELECT 1 FROM checkpoints c WHERE c.thread_id = writes.thread_id"
+                "  AND c.checkpoint_ns = writes.checkpoint_ns AND c.checkpoint_id = writes.checkpoint_id)"
+            )
+            deleted["orphan_writes"] = cur.rowcount
+            await self._batched.flush()
+            await self._batched.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return deleted
+
+    def start_compaction(self, interval: float = 600.0) -> asyncio.Task:
+        """Run acompact() every `interval` seconds in the background."""
+        async def _loop() -> None:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    deleted = await self.acompact()
+                    log.info("Checkpoint compaction: %s", deleted)
+                except Exception as e:
+                    log.warning("Checkpoint compaction failed: %s", e)
+
+        if self._compactor is None or self._compactor.done():
+            self._compactor = asyncio.get_running_loop().create_task(_loop())
+        return self._compactor
+
+    async def aclose(self) -> None:
+        if self._compactor is not None:
+            self._compactor.cancel()
+        # the delayed commit would otherwise run against the closed connection
+        await self._batched.cancel_pending()
+        await self.aflush()
+        await self._batched._conn.close()
+
+    async def astats(self) -> Dict[str, Any]:
+        async with self.lock:
+            cur = await self._batched.execute("SELECT COUNT(*) FROM thread_activity")
+            (threads,) = await cur.fetchone()
+        return {"threads": threads}
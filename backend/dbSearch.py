@@ -1,28 +1,133 @@
 import pandas as pd
-from sentence_transformers import SentenceTransformer
 import faiss
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from model_registry import get_embedding_model, encode_query
+
+log = logging.getLogger(__name__)
+
+# On-disk cache for embeddings + FAISS indexes (set JARIR_INDEX_CACHE_DIR="" to disable)
+INDEX_CACHE_DIR = os.getenv(
+    "JARIR_INDEX_CACHE_DIR",
+    str(Path(__file__).parent.parent / ".cache" / "catalog_index"),
+)
+# Bump when the cached layout or the spec_text recipe changes
+INDEX_CACHE_VERSION = 1
+
+# Columns exact_search_catalog() can filter on, in drop-one priority order
+EXACT_SEARCH_KEYS = ["brand", "model", "cpu_model", "ram", "storage", "gpu_model"]
+_EMPTY_POSTING = np.empty(0, dtype=np.int64)
+
+# Product-card fallbacks for rows without a usable image / product page
+PLACEHOLDER_IMAGE_URL = "https://via.placeholder.com/300x200?text=No+Image"
+FALLBACK_PRODUCT_URL = "https://www.jarir.com/"
+# Price columns in preference order; a card shows the first one that parses
+CARD_PRICE_COLUMNS = ["sale_price_sar", "price", "regular_price_sar"]
+# Raw columns carried on each card for variant grouping (NaN → None)
+CARD_SPEC_COLUMNS = ["color", "cpu_model", "gpu_model", "ram", "storage", "screen_size_inch"]
+# Rows equal on these card fields are one variant family (the same device in another color)
+FAMILY_KEY_COLUMNS = ["brand", "model", "cpu_model", "gpu_model", "ram", "storage", "screen_size_inch"]
+
+
+def file_sha256(path: str) -> str:
+    """Return the hex SHA-256 of a file's bytes."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def catalog_cache_key(
+    csv_path: str,
+    spec_columns: List[str],
+    embedding_model_name: str,
+) -> str:
+    """
+    Content-addressed key for a catalog index: changes whenever the CSV bytes,
+    the spec columns (and their order) or the embedding model change.
+    """
+    payload = json.dumps(
+        {
+            "version": INDEX_CACHE_VERSION,
+            "csv_sha256": file_sha256(csv_path),
+            "spec_columns": list(spec_columns),
+            "model": embedding_model_name,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _load_cached_index(cache_path: Path, n_rows: int) -> Optional[Tuple[np.ndarray, Any]]:
+    """Load (embeddings, index) from cache_path, or None if absent/stale/corrupt."""
+    emb_file = cache_path / "embeddings.npy"
+    index_file = cache_path / "index.faiss"
+    if not (emb_file.exists() and index_file.exists()):
+        return None
+    try:
+        embeddings = np.load(emb_file)
+        index = faiss.read_index(str(index_file))
+    except Exception as e:
+        log.warning("Ignoring unreadable index cache %s: %s", cache_path, e)
+        return None
+    if embeddings.shape[0] != n_rows or index.ntotal != n_rows:
+        return None
+    return embeddings, index
+
+
+def _save_cached_index(cache_path: Path, embeddings: np.ndarray, index: Any, meta: Dict[str, Any]) -> None:
+    """Write embeddings + index atomically (tmp file then rename) so readers never see partial files."""
+    try:
+        cache_path.mkdir(parents=True, exist_ok=True)
+        pid = os.getpid()
+        tmp_emb = cache_path / f"embeddings.{pid}.tmp.npy"
+        tmp_index = cache_path / f"index.{pid}.tmp"
+        np.save(tmp_emb, embeddings)
+        faiss.write_index(index, str(tmp_index))
+        os.replace(tmp_emb, cache_path / "embeddings.npy")
+        os.replace(tmp_index, cache_path / "index.faiss")
+        (cache_path / "meta.json").write_text(json.dumps(meta, indent=2))
+    except OSError as e:
+        # A read-only or full disk only costs us the warm start next time
+        log.warning("Could not write index cache %s: %s", cache_path, e)
+
 
 def create_catalog_index(
     csv_path: str,
     spec_columns: List[str],
-    embedding_model_name: str = "all-MiniLM-L6-v2"
+    embedding_model_name: str = "all-MiniLM-L6-v2",
+    cache_dir: Optional[str] = INDEX_CACHE_DIR,
 ) -> Dict[str, Any]:
     """
     Loads a CSV, builds spec-text embeddings, and a FAISS index.
 
+    Embeddings and the index are cached on disk under `cache_dir`, keyed by
+    catalog_cache_key(); a warm start loads them instead of re-encoding.
+
     Parameters:
     - csv_path: Path to the CSV file.
     - spec_columns: List of column names to include in embeddings.
-    - embedding_model_name: SentenceTransformer model name.
+    - embedding_model_name: SentenceTransformer model name or local path.
+    - cache_dir: Directory for the embedding/index cache (None or "" disables it).
 
     Returns a dict containing:
     - df: pandas DataFrame with original data and 'spec_text'
-    - embed_model: the SentenceTransformer instance
+    - embedding_model_name: name to pass to model_registry.get_embedding_model()
     - embeddings: numpy array of normalized embeddings
     - index: FAISS IndexFlatIP index over embeddings
     - metadata: DataFrame with 'id' and the spec_columns for lookup
+    - cache_key: content hash identifying this catalog's inputs
+    - inverted_index / prices: exact-search structures (see exact_search_catalog)
+    - id_index / records: id → row lookup (see get_rows_by_ids)
+    - cards: product card per row, aligned with records (see build_product_cards)
+    - family_of / families: variant family per row and per family (see build_variant_families)
     """
     # 1) Load & prepare DataFrame
     df = pd.read_csv(csv_path)
@@ -30,7 +135,6 @@ def create_catalog_index(
     
     # Ensure spec columns exist
     missing = [c for c in spec_columns if c not in df.columns]
-    print(missing)
     if missing:
         raise ValueError(f"Missing expected columns in CSV: {missing}"+df.head().to_string())
 
@@ -43,36 +147,317 @@ def create_catalog_index(
         .str.replace(r"\s+", " ", regex=True)
     )
 
-    # 2) Compute embeddings
-    embed_model = SentenceTransformer(embedding_model_name)
-    embeddings = embed_model.encode(
-        df["spec_text"].tolist(),
-        convert_to_numpy=True,
-        show_progress_bar=True
-    )
-    # Normalize for cosine-similarity
-    faiss.normalize_L2(embeddings)
+    # 2) Compute embeddings (or reuse the cached ones; the model is only loaded on a miss)
+    cache_key = catalog_cache_key(csv_path, spec_columns, embedding_model_name)
+    cache_path = Path(cache_dir) / cache_key if cache_dir else None
+    cached = _load_cached_index(cache_path, len(df)) if cache_path else None
+
+    if cached is not None:
+        embeddings, index = cached
+    else:
+        embed_model = get_embedding_model(embedding_model_name)
+        embeddings = embed_model.encode(
+            df["spec_text"].tolist(),
+            convert_to_numpy=True,
+            show_progress_bar=True
+        )
+        # Normalize for cosine-similarity
+        faiss.normalize_L2(embeddings)
+
+        # 3) Build FAISS index
+        dim = embeddings.shape[1]
+        index = faiss.IndexFlatIP(dim)
+        index.add(embeddings)
 
-    # 3) Build FAISS index
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatIP(dim)
-    index.add(embeddings)
+        if cache_path:
+            _save_cached_index(cache_path, embeddings, index, {
+                "csv_path": str(csv_path),
+                "spec_columns": list(spec_columns),
+                "model": embedding_model_name,
+                "rows": len(df),
+            })
 
     # 4) Prepare metadata mapping
     metadata = df[["id"] + spec_columns].copy()
 
+    # 5) Exact-search structures: postings per searchable column + numeric prices
+    inverted_index = build_inverted_index(df, EXACT_SEARCH_KEYS)
+    prices = (
+        pd.to_numeric(df["price"], errors="coerce").to_numpy(dtype=float)
+        if "price" in df.columns else np.full(len(df), np.nan)
+    )
+
+    # 6) Row lookup: id → position index plus pre-materialized row dicts
+    id_index = pd.Index(df["id"])
+    records = df.to_dict("records")
+
+    # 7) Frontend cards: static per row, so mapped once here instead of per request
+    cards = build_product_cards(df)
+    family_of, families = build_variant_families(cards)
+
     return {
         "df": df,
-        "embed_model": embed_model,
+        "embedding_model_name": embedding_model_name,
         "embeddings": embeddings,
         "index": index,
-        "metadata": metadata
+        "metadata": metadata,
+        "cache_key": cache_key,
+        "inverted_index": inverted_index,
+        "prices": prices,
+        "id_index": id_index,
+        "records": records,
+        "cards": cards,
+        "family_of": family_of,
+        "families": families,
     }
 
+
+def get_rows_by_ids(catalog: Dict[str, Any], ids: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Resolve catalog ids to row dicts in one vectorized lookup, keeping `ids` order.
+    Unknown ids are skipped. Returned dicts are copies, safe to mutate.
+    """
+    positions = catalog["id_index"].get_indexer(ids)
+    records = catalog["records"]
+    return [dict(records[p]) for p in positions if p >= 0]
+
+
+def get_family_cards(catalog: Dict[str, Any], ids: List[Any]) -> List[Dict[str, Any]]:
+    """
+    One card per variant family among `ids`, in order of each family's first hit.
+
+    The card is that hit's own card (id, name, image, url, badges) priced at the
+    family's lowest price, plus the family's "Price:" / "Colors:" badges.
+    Families without a valid price are skipped; unknown ids are ignored.
+    """
+    positions = catalog["id_index"].get_indexer(ids)
+    family_of = catalog["family_of"]
+    families = catalog["families"]
+    cards = catalog["cards"]
+    seen: set[int] = set()
+    out: List[Dict[str, Any]] = []
+    for p in positions[positions >= 0].tolist():
+        fid = int(family_of[p])
+        if fid in seen:
+            continue
+        seen.add(fid)
+        family = families[fid]
+        if family["price_min"] is None:
+            continue
+        card = cards[p]
+        out.append({
+            "id": card["id"],
+            "name": card["name"],
+            "image": card["image"],
+            "priceSar": family["price_min"],
+            "url": card["url"],
+            "badges": card["badges"] + family["badges"],
+        })
+    return out
+
+
+def _first_per_family(positions: np.ndarray, family_of: np.ndarray) -> np.ndarray:
+    """Keep the first of `positions` from each variant family, preserving order."""
+    _, first = np.unique(family_of[positions], return_index=True)
+    return positions[np.sort(first)]
+
+
+def card_value(value: Any) -> Any:
+    """A card field's value: None if missing (None / NaN / NA), else unchanged."""
+    return None if pd.api.types.is_scalar(value) and pd.isna(value) else value
+
+
+def card_text(value: Any) -> str:
+    """A card text field: the value as a stripped string, "" if missing."""
+    value = card_value(value)
+    return "" if value is None else str(value).strip()
+
+
+# Both card paths (build_product_cards and tools._map_raw_product_to_card) go
+# through card_value / card_text, so they agree on every missing value
+def _text_column(df: pd.DataFrame, col: str) -> pd.Series:
+    """`col` through card_text ("" for an absent column)."""
+    values = df[col].tolist() if col in df.columns else [None] * len(df)
+    return pd.Series([card_text(v) for v in values], index=df.index, dtype=object)
+
+
+def _optional_column(df: pd.DataFrame, col: str) -> pd.Series:
+    """`col` through card_value (all None for an absent column)."""
+    values = df[col].tolist() if col in df.columns else [None] * len(df)
+    # built from a list: a scalar None (or Series.where) would be filled in as NaN
+    return pd.Series([card_value(v) for v in values], index=df.index, dtype=object)
+
+
+def build_product_cards(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Map every catalog row to the frontend card shape in one vectorized pass.
+
+    Same rules as tools._map_raw_product_to_card: name is "brand model",
+    price is the first parseable of CARD_PRICE_COLUMNS ("SAR" and thousands
+    separators stripped, 0.0 if none), image/url fall back to the placeholders,
+    badges are the discount ("17% off") plus "Renewed" or "New". Missing values
+    are "" for text fields and None for CARD_SPEC_COLUMNS.
+
+    Returns one card dict per row, in row order.
+    """
+    brand = _text_column(df, "brand")
+    model = _text_column(df, "model")
+    name = (brand + " " + model).str.strip().replace("", "Product")
+
+    image = _text_column(df, "image_url")
+    image = image.where(image.str.startswith("http"), PLACEHOLDER_IMAGE_URL)
+    url = _text_column(df, "product_url").replace("", FALLBACK_PRODUCT_URL)
+
+    price = pd.Series(np.nan, index=df.index)
+    for col in CARD_PRICE_COLUMNS:
+        text = _text_column(df, col).str.replace("SAR", "", regex=False).str.replace(",", "", regex=False)
+        price = price.fillna(pd.to_numeric(text.str.strip(), errors="coerce"))
+    price = price.fillna(0.0)
+
+    discount = _text_column(df, "discount_percent")
+    has_discount = ~discount.str.lower().isin(["", "nan", "none", "null"])
+    condition = np.where(_text_column(df, "renewed").str.lower() == "renewed", "Renewed", "New")
+    badges = [
+        [f"{d} off", c] if has_d else [c]
+        for d, has_d, c in zip(discount, has_discount, condition)
+    ]
+
+    cards = pd.DataFrame({
+        "id": df["id"].astype(str),
+        "name": name,
+        "image": image,
+        "priceSar": price.astype(float),
+        "url": url,
+        "badges": badges,
+        "brand": brand,
+        "model": model,
+        **{col: _optional_column(df, col) for col in CARD_SPEC_COLUMNS},
+    }, index=df.index)
+    return cards.to_dict("records")
+
+
+def build_variant_families(cards: List[Dict[str, Any]]) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+    """
+    Group catalog rows into variant families: rows whose cards agree on
+    FAMILY_KEY_COLUMNS, i.e. the same device sold in several colors.
+
+    Returns (family_of, families):
+    - family_of: family id per row position (ids numbered in first-seen order)
+    - families[id]: members (row positions, in row order), price_min / price_max
+      over positive prices (None if no member has one), colors (distinct, in
+      row order), urls (color or "N/A" → product URL of its first member) and
+      badges ("Price: a - b SAR" for a range, "Colors: ..." for several colors)
+    """
+    if not cards:
+        return np.empty(0, dtype=np.int64), []
+    frame = pd.DataFrame(cards)
+    family_of = (
+        frame[FAMILY_KEY_COLUMNS].astype(str)
+        .groupby(FAMILY_KEY_COLUMNS, sort=False, dropna=False)
+        .ngroup()
+        .to_numpy(dtype=np.int64)
+    )
+    prices = frame["priceSar"].to_numpy(dtype=float)
+    order = np.argsort(family_of, kind="stable")
+    members_by_family = np.split(order, np.cumsum(np.bincount(family_of))[:-1])
+
+    families: List[Dict[str, Any]] = []
+    for members in members_by_family:
+        member_prices = prices[members]
+        valid = member_prices[member_prices > 0]
+        price_min = float(valid.min()) if len(valid) else None
+        price_max = float(valid.max()) if len(valid) else None
+        colors = list(dict.fromkeys(cards[p]["color"] for p in members.tolist()))
+        urls: Dict[str, str] = {}
+        for p in members.tolist():
+            urls.setdefault(str(cards[p]["color"] or "N/A"), cards[p]["url"])
+
+        badges: List[str] = []
+        if price_min != price_max:
+            badges.append(f"Price: {price_min} - {price_max} SAR")
+        colors_label = ", ".join(c for c in colors if c) or "N/A"
+        if len(colors) > 1 and colors_label != "N/A":
+            badges.append(f"Colors: {colors_label}")
+
+        families.append({
+            "members": members,
+            "price_min": price_min,
+            "price_max": price_max,
+            "colors": colors,
+            "urls": urls,
+            "badges": badges,
+        })
+    return family_of, families
+
+
+def build_inverted_index(df: pd.DataFrame, columns: List[str]) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Map each column to {normalized value → sorted array of row positions}.
+
+    Values are normalized exactly like the old per-query filter did
+    (`astype(str).str.lower()`), so lookups match the same rows.
+    Columns absent from the DataFrame are skipped.
+    """
+    inverted: Dict[str, Dict[str, np.ndarray]] = {}
+    for col in columns:
+        if col not in df.columns:
+            continue
+        values = df[col].astype(str).str.lower().reset_index(drop=True)
+        # groupby(...).indices gives each value's positions in ascending order
+        inverted[col] = {
+            val: pos.astype(np.int64)
+            for val, pos in values.groupby(values, sort=False).indices.items()
+        }
+    return inverted
+
+# Catalogs keyed by catalog_cache_key(): aliases over the same CSV + config share one object
+_CATALOG_REGISTRY: Dict[str, Dict[str, Any]] = {}
+_registry_lock = threading.Lock()
+_key_locks: Dict[str, threading.Lock] = {}
+
+
+def load_catalog(
+    csv_path: str,
+    spec_columns: List[str],
+    embedding_model_name: str = "all-MiniLM-L6-v2",
+) -> Dict[str, Any]:
+    """
+    Return the shared catalog for (CSV content, spec columns, model), building it
+    with create_catalog_index() the first time that combination is requested.
+
+    Two paths with identical bytes and configuration resolve to the same catalog
+    object, so it is parsed, embedded and held in memory once.
+    """
+    key = catalog_cache_key(csv_path, spec_columns, embedding_model_name)
+    catalog = _CATALOG_REGISTRY.get(key)
+    if catalog is not None:
+        return catalog
+
+    with _registry_lock:
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        catalog = _CATALOG_REGISTRY.get(key)
+        if catalog is None:
+            catalog = create_catalog_index(csv_path, spec_columns, embedding_model_name)
+            _CATALOG_REGISTRY[key] = catalog
+    return catalog
+
+
+def clear_catalog_registry() -> None:
+    """Forget every shared catalog; the next load_catalog() call rebuilds from disk."""
+    with _registry_lock:
+        _CATALOG_REGISTRY.clear()
+        _key_locks.clear()
+
+
 def exact_search_catalog(
     specs: Dict[str, str],
     catalog: Dict[str, Any],
     top_k: int = 20,
+    ranking: str = "tiered",
+    min_matches: Optional[int] = None,
+    key_weights: Optional[Dict[str, float]] = None,
+    one_per_family: bool = False,
 ) -> List[Dict[str, Any]]:
     """
     Multi-level exact CSV search (no embeddings), with exact-match items ranked first.
@@ -83,46 +468,231 @@ def exact_search_catalog(
     2. Matches N-1 keys (“drop-one” matches) – preserve dataframe order
     3. Remaining ties keep their original order in the dataframe
 
+    Matching runs on the catalog's precomputed inverted index: each pass is an
+    intersection of sorted row-position arrays, not a scan of the DataFrame.
+    A key whose column the catalog does not have matches no rows.
+
+    ranking="scored" instead builds one rows × keys boolean match matrix and
+    ranks by (weighted) match count, then dataframe order:
+    - min_matches: fewest keys a row must match (default N-1, like the tiers;
+      N-2 etc. widen the net at no extra cost)
+    - key_weights: per-key weight for the score (default 1.0 each)
+
+    one_per_family=True keeps only the best-ranked row of each variant family,
+    so color variants do not use up the `top_k` slots.
+
     Returns at most `top_k` items as [{'id': ...}, …]
     """
-    df        = catalog["df"].copy()
-    id_col    = "id"
-    price_col = "price"
+    if top_k <= 0:
+        return []
+    inverted = catalog["inverted_index"]
+    ids      = catalog["df"]["id"].to_numpy()
+    n_rows   = len(ids)
 
     # 1) budget filter
+    allowed: Optional[np.ndarray] = None
     try:
-        df = df[df[price_col] <= float(specs["price"])]
+        allowed = catalog["prices"] <= float(specs["price"])
     except (KeyError, ValueError, TypeError):
         pass
 
-    # 2) build filter dict
-    search_keys = ["brand", "model", "cpu_model", "ram", "storage", "gpu_model"]
-    base = {k: specs[k] for k in search_keys if specs.get(k)}
+    # 2) build filter dict → postings per key
+    base = {k: specs[k] for k in EXACT_SEARCH_KEYS if specs.get(k)}
+    postings = {
+        k: inverted.get(k, {}).get(str(v).lower(), _EMPTY_POSTING)
+        for k, v in base.items()
+    }
+
+    if ranking == "scored":
+        if one_per_family:
+            ordered = _scored_positions(base, postings, n_rows, allowed, n_rows, min_matches, key_weights)
+            ordered = _first_per_family(ordered, catalog["family_of"])[:top_k]
+        else:
+            ordered = _scored_positions(base, postings, n_rows, allowed, top_k, min_matches, key_weights)
+        return [{"id": _id} for _id in ids[ordered].tolist()]
+    if ranking != "tiered":
+        raise ValueError(f"Unknown ranking '{ranking}', expected 'tiered' or 'scored'")
+
+    def _match(keys: List[str]) -> np.ndarray:
+        if not keys:
+            pos = np.arange(n_rows)
+        else:
+            # intersect smallest-first so the working set shrinks fastest
+            lists = sorted((postings[k] for k in keys), key=len)
+            pos = lists[0]
+            for other in lists[1:]:
+                if not len(pos):
+                    break
+                pos = np.intersect1d(pos, other, assume_unique=True)
+        if allowed is not None:
+            pos = pos[allowed[pos]]
+        return pos
 
-    def _filter_exact(d: pd.DataFrame, f: Dict[str, str]) -> pd.DataFrame:
-        sub = d
-        for col, val in f.items():
-            sub = sub[sub[col].astype(str).str.lower() == val.lower()]
-        return sub
+    seen: set[int] = set()
+    ordered: list[int] = []
+    family_of = catalog["family_of"] if one_per_family else None
+    seen_families: set[int] = set()
 
-    seen_ids: set[str] = set()
-    ordered_ids: list[str] = []
+    def _take(pos: np.ndarray) -> bool:
+        for p in pos.tolist():
+            if p in seen:
+                continue
+            seen.add(p)
+            if family_of is not None:
+                family = int(family_of[p])
+                if family in seen_families:
+                    continue
+                seen_families.add(family)
+            ordered.append(p)
+            if len(ordered) >= top_k:
+                return True
+        return False
 
     # 3) full-spec pass  ➜ highest priority
-    full_matches = _filter_exact(df, base)
-    for _id in full_matches[id_col]:
-        if _id not in seen_ids:
-            ordered_ids.append(_id)
-            seen_ids.add(_id)
+    done = _take(_match(list(base)))
 
     # 4) drop-one passes  ➜ lower priority but still exact on remaining keys
     for drop_key in base:
-        filt = {k: v for k, v in base.items() if k != drop_key}
-        part_matches = _filter_exact(df, filt)
-        for _id in part_matches[id_col]:
-            if _id not in seen_ids:
-                ordered_ids.append(_id)
-                seen_ids.add(_id)
-
-    # 5) format & truncate
-    return [{"id": _id} for _id in ordered_ids[:top_k]]
\ No newline at end of file
+        if done:
+            break
+        done = _take(_match([k for k in base if k != drop_key]))
+
+    # 5) format (already truncated to top_k)
+    return [{"id": _id} for _id in ids[ordered].tolist()]
+
+
+
+def _scored_positions(
+    base: Dict[str, str],
+    postings: Dict[str, np.ndarray],
+    n_rows: int,
+    allowed: Optional[np.ndarray],
+    top_k: int,
+    min_matches: Optional[int],
+    key_weights: Optional[Dict[str, float]],
+) -> np.ndarray:
+    """Single-pass ranking for exact_search_catalog(ranking="scored")."""
+    keys = list(base)
+    matrix = np.zeros((n_rows, len(keys)), dtype=bool)
+    for j, k in enumerate(keys):
+        matrix[postings[k], j] = True
+
+    counts = matrix.sum(axis=1)
+    weights = np.array([(key_weights or {}).get(k, 1.0) for k in keys], dtype=float)
+    scores = matrix @ weights
+
+    if min_matches is None:
+        min_matches = max(len(keys) - 1, 0)
+    eligible = counts >= min_matches
+    if allowed is not None:
+        eligible &= allowed
+
+    # walk score levels best-first; flatnonzero keeps dataframe order within a level
+    picked: List[np.ndarray] = []
+    remaining = top_k
+    for level in np.unique(scores[eligible])[::-1]:
+        pos = np.flatnonzero(eligible & (scores == level))[:remaining]
+        picked.append(pos)
+        remaining -= len(pos)
+        if remaining <= 0:
+            break
+    return np.concatenate(picked) if picked else _EMPTY_POSTING
+
+
+def _spec_query_text(specs: Dict[str, str]) -> str:
+    """Join the provided spec values into one query string, mirroring spec_text (price excluded)."""
+    parts = [str(v) for k, v in specs.items() if k != "price" and v not in (None, "")]
+    return " ".join(" ".join(parts).split())
+
+
+def hybrid_search_catalog(
+    specs: Dict[str, str],
+    catalog: Dict[str, Any],
+    top_k: int = 20,
+    min_similarity: float = 0.5,
+    fusion: str = "exact_first",
+    semantic_weight: float = 0.5,
+    rrf_k: int = 60,
+    one_per_family: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Exact matching first, then FAISS kNN over the spec embeddings for the rest.
+
+    The spec values are embedded with the catalog's model and searched against
+    its IndexFlatIP; semantic-only hits must reach `min_similarity` (cosine) and
+    respect the budget filter.
+
+    fusion:
+    - "exact_first": exact hits in their usual order, then semantic hits by similarity
+    - "rrf": weighted reciprocal-rank fusion over both lists,
+      score = (1 - semantic_weight)/(rrf_k + exact_rank) + semantic_weight/(rrf_k + semantic_rank)
+
+    one_per_family: as in exact_search_catalog(), applied after fusion.
+
+    Returns at most `top_k` items as [{'id': ..., 'match': 'exact'|'semantic', 'similarity': float}, …]
+    """
+    if fusion not in ("exact_first", "rrf"):
+        raise ValueError(f"Unknown fusion '{fusion}', expected 'exact_first' or 'rrf'")
+    if top_k <= 0:
+        return []
+
+    if sum(1 for k in EXACT_SEARCH_KEYS if specs.get(k)) == 1:
+        # a lone key's drop-one pass matches every row; keep real matches and let FAISS fill
+        exact = exact_search_catalog(
+            specs, catalog, top_k=top_k, ranking="scored", min_matches=1, one_per_family=one_per_family,
+        )
+    else:
+        exact = exact_search_catalog(specs, catalog, top_k=top_k, one_per_family=one_per_family)
+    query_text = _spec_query_text(specs)
+    n_rows = catalog["index"].ntotal
+    if not query_text or n_rows == 0 or (fusion == "exact_first" and len(exact) >= top_k):
+        return [{**e, "match": "exact", "similarity": None} for e in exact]
+
+    query = encode_query(catalog["embedding_model_name"], query_text)
+    ids = catalog["df"]["id"].to_numpy()
+    exact_pos = catalog["id_index"].get_indexer([e["id"] for e in exact])
+
+    allowed: Optional[np.ndarray] = None
+    try:
+        allowed = catalog["prices"] <= float(specs["price"])
+    except (KeyError, ValueError, TypeError):
+        pass
+
+    # oversample so budget-filtered and already-exact rows do not starve the fill
+    k = min(n_rows, (top_k + len(exact)) * 4)
+    sims, positions = catalog["index"].search(query, k)
+    exact_set = set(exact_pos.tolist())
+    semantic: List[Tuple[int, float]] = []
+    for pos, sim in zip(positions[0].tolist(), sims[0].tolist()):
+        if pos < 0 or pos in exact_set or sim < min_similarity:
+            continue
+        if allowed is not None and not allowed[pos]:
+            continue
+        semantic.append((pos, sim))
+
+    exact_sims = catalog["embeddings"][exact_pos] @ query[0] if len(exact_pos) else np.empty(0)
+    results = [
+        {"id": ids[p].item(), "match": "exact", "similarity": float(s)}
+        for p, s in zip(exact_pos.tolist(), exact_sims.tolist())
+    ]
+    results += [{"id": ids[p].item(), "match": "semantic", "similarity": s} for p, s in semantic]
+
+    if fusion == "rrf":
+        exact_rank = {r["id"]: i for i, r in enumerate(results[:len(exact)], 1)}
+        by_sim = sorted(results, key=lambda r: -r["similarity"])
+        sem_rank = {r["id"]: i for i, r in enumerate(by_sim, 1)}
+
+        def _score(r: Dict[str, Any]) -> float:
+            score = semantic_weight / (rrf_k + sem_rank[r["id"]])
+            if r["id"] in exact_rank:
+                score += (1 - semantic_weight) / (rrf_k + exact_rank[r["id"]])
+            return score
+
+        results.sort(key=_score, reverse=True)
+
+    if one_per_family and results:
+        positions = catalog["id_index"].get_indexer([r["id"] for r in results])
+        kept = set(_first_per_family(positions, catalog["family_of"]).tolist())
+        results = [r for r, p in zip(results, positions.tolist()) if p in kept]
+
+    return results[:top_k]
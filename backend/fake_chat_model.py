@@ -0,0 +1,136 @@
+"""
+Scripted stand-in for the Gemini chat model, for offline load tests and demos.
+
+Select it with JARIR_CHAT_MODEL=fake (built-in script) or JARIR_CHAT_MODEL=fake:<script.json>.
+A script is:
+
+    {
+      "latency_s": 0.8,          # simulated model time per call
+      "jitter_s": 0.2,           # ± uniform noise added to latency_s
+      "rules": [                 # first rule whose regex matches the last user message wins
+        {"match": "(?P<brand>lenovo|hp)\\s+(?P<product_type>laptop|tablet)",
+         "tool": "get_product_recommendations", "args": {}},
+        {"match": "brands?", "tool": "retrieve_information_about_product_type", "args": {"product_type": "laptop"}},
+        {"match": ".*", "reply": "How can I help you today?"}
+      ],
+      "after_tool_reply": "Here is what I found."
+    }
+
+Named regex groups are merged into the tool arguments. After a tool result the
+model answers with after_tool_reply, like a real model summarizing it.
+"""
+
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+DEFAULT_SCRIPT: Dict[str, Any] = {
+    "latency_s": 0.8,
+    "jitter_s": 0.2,
+    "rules": [
+        {
+            "match": r"(?P<brand>lenovo|hp|apple|asus|acer|msi|huawei|samsung|microsoft)\b.*\b(?P<product_type>laptop|tablet|gaming|desktop|aio)",
+            "tool": "get_product_recommendations",
+            "args": {},
+        },
+        {
+            "match": r"\b(?P<product_type>laptop|tablet|gaming|desktop|aio)s?\b.*\bbrands?\b|\bbrands?\b.*\b(?P<product_type2>laptop|tablet)",
+            "tool": "retrieve_information_about_product_type",
+            "args": {"product_type": "laptop"},
+        },
+        {"match": r".*", "reply": "Hello! What kind of device are you looking for, and what will you use it for?"},
+    ],
+    "after_tool_reply": "Here is what we currently have in stock.",
+}
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model that answers from regex rules after a simulated latency; no network."""
+
+    latency_s: float = 0.8
+    jitter_s: float = 0.0
+    rules: List[Dict[str, Any]] = []
+    after_tool_reply: str = "Here is what I found."
+
+    @classmethod
+    def from_script(cls, path: Optional[str] = None) -> "ScriptedChatModel":
+        script = dict(DEFAULT_SCRIPT)
+        if path:
+            with open(path, encoding="utf-8") as f:
+                script.update(json.load(f))
+        return cls(
+            latency_s=float(script.get("latency_s", 0.8)),
+            jitter_s=float(script.get("jitter_s", 0.0)),
+            rules=script.get("rules", []),
+            after_tool_reply=script.get("after_tool_reply", cls.model_fields["after_tool_reply"].default),
+        )
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ScriptedChatModel":
+        # tool calls come from the script, so the schemas are not needed
+        return self
+
+    def _delay(self) -> float:
+        jitter = random.uniform(-self.jitter_s, self.jitter_s) if self.jitter_s else 0.0
+        return max(0.0, self.latency_s + jitter)
+
+    def _respond(self, messages: List[BaseMessage]) -> ChatResult:
+        last = messages[-1] if messages else None
+        if isinstance(last, ToolMessage):
+            message = AIMessage(content=self.after_tool_reply)
+        else:
+            text = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+            text = text if isinstance(text, str) else str(text)
+            message = self._apply_rules(text)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _apply_rules(self, text: str) -> AIMessage:
+        for rule in self.rules:
+            m = re.search(rule.get("match", ".*"), text, re.IGNORECASE | re.DOTALL)
+            if not m:
+                continue
+            if "tool" in rule:
+                args = dict(rule.get("args") or {})
+                # "product_type2" etc.: alternatives for the same argument in one regex
+                for name, value in m.groupdict().items():
+                    if value:
+                        args[name.rstrip("0123456789")] = value.lower()
+                return AIMessage(
+                    content="",
+                    tool_calls=[{"name": rule["tool"], "args": args, "id": f"call_{uuid.uuid4().hex[:12]}"}],
+                )
+            return AIMessage(content=rule.get("reply", ""))
+        return AIMessage(content="")
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self._delay())
+        return self._respond(messages)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        # a remote model is I/O bound: wait without holding the event loop
+        await asyncio.sleep(self._delay())
+        return self._respond(messages)
@@ -0,0 +1,211 @@
+"""
+Offline end-to-end load test of /chat.
+
+N virtual shoppers each replay scripted conversations against /chat (one session
+per conversation, optional think time between messages) for a fixed duration or
+number of requests. By default the FastAPI app runs in this process behind
+httpx.ASGITransport with the scripted fake chat model (fake_chat_model.py), so no
+network or Gemini quota is needed; --url targets a running server instead.
+
+    python loadtest.py --shoppers 50 --duration 30
+    python loadtest.py --shoppers 20 --requests 500 --llm-latency 1.2 --json report.json
+    python loadtest.py --url http://127.0.0.1:8000 --shoppers 20 --duration 60
+
+Reports throughput (RPS), latency p50/p95/p99 and, in-process, a per-stage
+breakdown (LLM calls, each tool) collected with timing.StageTimer.
+
+Offline hosts need the embedding model on disk (JARIR_EMBEDDING_MODEL_DIR) or a
+warm catalog index cache (JARIR_INDEX_CACHE_DIR).
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from log_setup import setup_logging
+from timing import percentile
+
+# Default workload: a mix of fully specified searches (router fast path), agent
+# searches, catalog questions and small talk
+DEFAULT_CONVERSATIONS: List[List[str]] = [
+    ["hi", "I need a laptop for university", "Lenovo laptop please"],
+    ["show me Lenovo Yoga Pro 7 32 GB RAM"],
+    ["what laptop brands do you have?", "HP laptops"],
+    ["do you sell gaming PCs from MSI?", "MSI gaming laptop 32gb ram"],
+    ["I want an Apple tablet for drawing", "apple ipad pro 11 m2 256gb storage"],
+    ["hello", "what tablet brands do you carry?", "Samsung Galaxy Tab S9"],
+]
+
+
+class LoadStats:
+    def __init__(self) -> None:
+        self.latencies: List[float] = []
+        self.statuses: Dict[str, int] = {}
+        self.errors = 0
+
+    def record(self, elapsed: float, status: str, ok: bool) -> None:
+        self.latencies.append(elapsed)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.errors += not ok
+
+
+async def _shopper(
+    idx: int,
+    client: httpx.AsyncClient,
+    conversations: List[List[str]],
+    stats: LoadStats,
+    deadline: float,
+    budget: Dict[str, int],
+    think_time: float,
+) -> None:
+    turn = idx
+    while True:
+        messages = conversations[turn % len(conversations)]
+        turn += 1
+        session_id = f"load-{idx}-{uuid.uuid4().hex[:8]}"
+        for message in messages:
+            if time.monotonic() >= deadline or budget["left"] <= 0:
+                return
+            budget["left"] -= 1
+            started = time.perf_counter()
+            try:
+                resp = await client.post("/chat", json={"message": message, "session_id": session_id})
+                status, ok = str(resp.status_code), resp.status_code == 200
+            except httpx.HTTPError as e:
+                status, ok = type(e).__name__, False
+            stats.record(time.perf_counter() - started, status, ok)
+            if think_time:
+                await asyncio.sleep(think_time)
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    shoppers: int,
+    duration: float,
+    requests: Optional[int],
+    conversations: List[List[str]],
+    think_time: float = 0.0,
+) -> Dict[str, Any]:
+    """Drive /chat with `shoppers` concurrent virtual shoppers; returns the client-side report."""
+    stats = LoadStats()
+    deadline = time.monotonic() + duration if duration else float("inf")
+    budget = {"left": requests if requests else 10**12}
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _shopper(i, client, conversations, stats, deadline, budget, think_time) for i in range(shoppers)
+    ))
+    wall = time.perf_counter() - started
+    lat = sorted(stats.latencies)
+    return {
+        "shoppers": shoppers,
+        "requests": len(lat),
+        "errors": stats.errors,
+        "statuses": stats.statuses,
+        "wall_s": round(wall, 2),
+        "rps": round(len(lat) / wall, 2) if wall else 0.0,
+        "p50_ms": round(1000 * percentile(lat, 0.50), 1),
+        "p95_ms": round(1000 * percentile(lat, 0.95), 1),
+        "p99_ms": round(1000 * percentile(lat, 0.99), 1),
+        "max_ms": round(1000 * lat[-1], 1) if lat else 0.0,
+    }
+
+
+async def _run_in_process(args: argparse.Namespace, conversations: List[List[str]]) -> Dict[str, Any]:
+    # must be set before agent_core is imported
+    os.environ.setdefault("JARIR_CHAT_MODEL", "fake" + (f":{args.model_script}" if args.model_script else ""))
+    os.environ.setdefault("LANGCHAIN_TRACING_V2", "false")
+
+    import agent_core
+    import app as app_module
+    import router
+    import tools
+    from timing import StageTimer
+
+    if args.llm_latency is not None:
+        from fake_chat_model import ScriptedChatModel
+        model = ScriptedChatModel.from_script(args.model_script)
+        model.latency_s = args.llm_latency
+        agent_core.set_chat_model(model)
+
+    timer = StageTimer()
+    agent_core.add_callback(timer)
+    tools.warmup(background=False)
+
+    async with app_module.lifespan(app_module.app):
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout) as client:
+            report = await run_load(client, args.shoppers, args.duration, args.requests, conversations, args.think_time)
+
+    report["stages"] = timer.summary(total_s=report["wall_s"] * args.shoppers)
+    report["router"] = router.router_stats()
+    report["recommendation_cache"] = tools.recommendation_cache_stats()
+    report["chat_model"] = agent_core.CHAT_MODEL
+    return report
+
+
+async def _run_remote(args: argparse.Namespace, conversations: List[List[str]]) -> Dict[str, Any]:
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+        return await run_load(client, args.shoppers, args.duration, args.requests, conversations, args.think_time)
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    print(f"\nshoppers {report['shoppers']}  requests {report['requests']}  errors {report['errors']}  "
+          f"wall {report['wall_s']} s  →  {report['rps']} req/s")
+    print(f"latency  p50 {report['p50_ms']} ms  p95 {report['p95_ms']} ms  "
+          f"p99 {report['p99_ms']} ms  max {report['max_ms']} ms")
+    print(f"statuses {report['statuses']}")
+    stages = report.get("stages")
+    if stages:
+        print(f"\n{'stage':44} {'count':>7} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'share':>7}")
+        for stage, s in stages.items():
+            print(f"{stage:44} {s['count']:>7} {s['mean_ms']:>9} {s['p50_ms']:>9} {s['p95_ms']:>9} "
+                  f"{s['p99_ms']:>9} {s.get('share', 0):>7.1%}")
+    if "router" in report:
+        r = report["router"]
+        print(f"\nfast path: {r['routed']}/{r['calls']} routed, avg {r['avg_ms']:.2f} ms")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline load test for /chat.")
+    parser.add_argument("--shoppers", type=int, default=20, help="concurrent virtual shoppers")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run (0 = until --requests)")
+    parser.add_argument("--requests", type=int, help="stop after this many requests in total")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds a shopper waits between messages")
+    parser.add_argument("--conversations", help="JSON file: list of conversations, each a list of messages")
+    parser.add_argument("--url", help="target a running server instead of the in-process app")
+    parser.add_argument("--model-script", help="fake_chat_model script (in-process only)")
+    parser.add_argument("--llm-latency", type=float, help="override the fake model latency in seconds")
+    parser.add_argument("--timeout", type=float, default=300.0, help="per-request client timeout")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the backend's own output")
+    args = parser.parse_args()
+    if not args.duration and not args.requests:
+        parser.error("give --duration or --requests")
+
+    conversations = DEFAULT_CONVERSATIONS
+    if args.conversations:
+        with open(args.conversations, encoding="utf-8") as f:
+            conversations = json.load(f)
+
+    runner = _run_remote if args.url else _run_in_process
+    # the in-process backend's request logs would drown the report
+    setup_logging(None if args.verbose else "WARNING")
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else open(os.devnull, "w")):
+        report = asyncio.run(runner(args, conversations))
+    _print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Logging for the backend: leveled, optionally JSON, and non-blocking.
+
+setup_logging() puts a QueueHandler on the root logger; a QueueListener thread
+does the actual formatting and writing, so request threads and the event loop
+only pay for an enqueue. Per-item messages (one per product row) are logged with
+extra=SAMPLED and pass a SamplingFilter: the first one of each kind is kept, then
+one in JARIR_LOG_SAMPLE_EVERY, each carrying how many were skipped.
+
+Environment:
+- JARIR_LOG_LEVEL: DEBUG / INFO (default) / WARNING / ...
+- JARIR_LOG_FORMAT: "text" (default) or "json"
+- JARIR_LOG_SAMPLE_EVERY: keep 1 in N sampled records (default 100, 1 = keep all)
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+LOG_LEVEL = os.getenv("JARIR_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("JARIR_LOG_FORMAT", "text").lower()
+LOG_SAMPLE_EVERY = max(1, int(os.getenv("JARIR_LOG_SAMPLE_EVERY", "100")))
+
+# Pass as extra= on per-item log calls so they are sampled instead of written one by one
+SAMPLED = {"sampled": True}
+
+# LogRecord attributes that are not user-supplied "extra" fields
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "sampled", "taskName"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Lets records without `sampled` through untouched; of the sampled ones, keeps
+    the 1st, (n+1)th, (2n+1)th, ... per (logger, message template) and stamps the
+    kept record with `skipped`, the number dropped since the previous one.
+    """
+
+    def __init__(self, every: int = LOG_SAMPLE_EVERY):
+        super().__init__()
+        self.every = every
+        self._seen: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False) or self.every <= 1:
+            return True
+        key = (record.name, str(record.msg))
+        with self._lock:
+            n = self._seen.get(key, 0)
+            self._seen[key] = n + 1
+        if n % self.every:
+            return False
+        record.skipped = self.every - 1 if n else 0
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message, extra fields, exc."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Like the stock prepare() (resolve args, drop the unpicklable traceback) but keep
+        # the formatted traceback in exc_text instead of folding it into the message
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self) -> None:
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        skipped = getattr(record, "skipped", 0)
+        return f"{text} (+{skipped} similar skipped)" if skipped else text
+
+
+def setup_logging(level: Optional[str] = None, fmt: Optional[str] = None, stream=None) -> None:
+    """
+    Route all logging through a queue to a background writer. Safe to call more
+    than once; later calls only change the level, and only if one is passed
+    (so a module calling setup_logging() does not undo a caller's level).
+    """
+    global _listener
+    root = logging.getLogger()
+    with _setup_lock:
+        if _listener is not None:
+            if level:
+                root.setLevel(level.upper())
+            return
+        root.setLevel((level or LOG_LEVEL).upper())
+        writer = logging.StreamHandler(stream or sys.stderr)
+        writer.setFormatter(JsonFormatter() if (fmt or LOG_FORMAT) == "json" else TextFormatter())
+
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        queue_handler = _QueueHandler(log_queue)
+        queue_handler.addFilter(SamplingFilter())
+        root.addHandler(queue_handler)
+
+        _listener = logging.handlers.QueueListener(log_queue, writer, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
@@ -0,0 +1,147 @@
+"""
+Prometheus instrumentation, exposed by app.py on GET /metrics.
+
+Histograms are observed where the work happens (request middleware, LangChain
+callbacks for LLM and tool calls, the search / family-card / payload steps);
+cache, catalog, router and session numbers are read from their modules' own
+stats at scrape time by JarirCollector, so the hot paths keep a single counter.
+"""
+
+import time
+from typing import Any, Dict, Iterator, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import REGISTRY, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# LLM calls and whole requests take seconds; search and payload steps take (sub-)milliseconds
+_SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+_FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+REQUEST_SECONDS = Histogram(
+    "jarir_request_seconds", "HTTP request latency", ["endpoint", "status"], buckets=_SLOW_BUCKETS,
+)
+LLM_CALL_SECONDS = Histogram(
+    "jarir_llm_call_seconds", "Latency of one chat-model call", ["outcome"], buckets=_SLOW_BUCKETS,
+)
+TOOL_CALL_SECONDS = Histogram(
+    "jarir_tool_call_seconds", "Latency of one agent tool run", ["tool", "outcome"], buckets=_FAST_BUCKETS + (2, 5, 10, 30),
+)
+EXACT_SEARCH_SECONDS = Histogram(
+    "jarir_exact_search_seconds", "exact_search_catalog latency", ["catalog"], buckets=_FAST_BUCKETS,
+)
+HYBRID_SEARCH_SECONDS = Histogram(
+    "jarir_hybrid_search_seconds", "hybrid_search_catalog latency", ["catalog"], buckets=_FAST_BUCKETS,
+)
+FAMILY_CARDS_SECONDS = Histogram(
+    "jarir_family_cards_seconds", "get_family_cards latency (hits to variant-family cards)", buckets=_FAST_BUCKETS,
+)
+PAYLOAD_VALIDATION_SECONDS = Histogram(
+    "jarir_payload_validation_seconds", "Product payload validation/serialization latency", buckets=_FAST_BUCKETS,
+)
+
+
+class PrometheusCallback(BaseCallbackHandler):
+    """Feeds LLM and tool call durations of every agent turn into the histograms above."""
+
+    run_inline = True
+
+    def __init__(self) -> None:
+        self._started: Dict[UUID, tuple] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = (None, time.perf_counter())
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._observe(run_id, "ok")
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._observe(run_id, "error")
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+        self._started[run_id] = (name, time.perf_counter())
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._observe(run_id, "ok")
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._observe(run_id, "error")
+
+    def _observe(self, run_id: UUID, outcome: str) -> None:
+        entry = self._started.pop(run_id, None)
+        if entry is None:
+            return
+        tool_name, started = entry
+        elapsed = time.perf_counter() - started
+        if tool_name is None:
+            LLM_CALL_SECONDS.labels(outcome).observe(elapsed)
+        else:
+            TOOL_CALL_SECONDS.labels(tool_name, outcome).observe(elapsed)
+
+
+class JarirCollector:
+    """Scrape-time view of the caches, loaded catalogs, fast-path router and sessions."""
+
+    def __init__(self) -> None:
+        # refreshed by refresh_session_stats() (the SQLite saver can only be asked from the event loop)
+        self.session_stats: Dict[str, Any] = {}
+
+    def describe(self) -> list:
+        # no eager collect() at registration: the modules read below import this one
+        return []
+
+    def collect(self) -> Iterator[Any]:
+        import tools
+        import router
+        from model_registry import query_cache_stats
+        from response_cache import semantic_cache
+
+        hits = CounterMetricFamily("jarir_cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("jarir_cache_misses", "Cache misses", labels=["cache"])
+        entries = GaugeMetricFamily("jarir_cache_entries", "Entries currently cached", labels=["cache"])
+        for name, stats in (
+            ("query_embedding", query_cache_stats()),
+            ("recommendation", tools.recommendation_cache_stats()),
+            ("semantic_response", semantic_cache.stats()),
+        ):
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+            entries.add_metric([name], stats["size"])
+        yield hits
+        yield misses
+        yield entries
+
+        rows = GaugeMetricFamily("jarir_catalog_rows", "Rows of each loaded catalog", labels=["catalog"])
+        for name, catalog in list(tools._catalogs.items()):
+            rows.add_metric([name], len(catalog["records"]))
+        yield rows
+        yield GaugeMetricFamily("jarir_catalog_version", "Catalog reload generation", value=tools.catalog_version)
+
+        routed = CounterMetricFamily("jarir_fast_path", "Fast-path router decisions", labels=["outcome"])
+        r = router.router_stats()
+        for outcome in ("routed", "fell_through", "no_results", "errors"):
+            routed.add_metric([outcome], r[outcome])
+        yield routed
+
+        coalesced = CounterMetricFamily("jarir_coalesced_calls", "Calls that joined an identical in-flight call", labels=["layer"])
+        coalesced.add_metric(["search"], tools._search_flight.coalesced)
+        coalesced.add_metric(["recommendation"], tools._recommendation_flight.coalesced)
+        yield coalesced
+
+        if "threads" in self.session_stats:
+            yield GaugeMetricFamily("jarir_active_sessions", "Conversations held by the checkpointer",
+                                    value=self.session_stats["threads"])
+        if "bytes" in self.session_stats:
+            yield GaugeMetricFamily("jarir_session_bytes", "Approximate bytes of in-memory conversation state",
+                                    value=self.session_stats["bytes"])
+
+
+collector = JarirCollector()
+REGISTRY.register(collector)
+prometheus_callback = PrometheusCallback()
+
+
+def refresh_session_stats(stats: Optional[Dict[str, Any]]) -> None:
+    collector.session_stats = dict(stats or {})
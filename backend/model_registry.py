@@ -0,0 +1,186 @@
+"""
+Process-wide registry of SentenceTransformer embedding models.
+
+Catalogs ask for their model by name; the registry loads each model once,
+hands the same instance to every caller, and releases it after it has sat
+idle for EMBEDDING_MODEL_IDLE_TTL seconds (it is re-loaded on next use).
+Query embeddings are cached per model in a bounded LRU with a TTL.
+"""
+
+import atexit
+import gc
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import faiss
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from cache_utils import LRUCache
+
+log = logging.getLogger(__name__)
+
+# Directory with pre-downloaded models for offline hosts, e.g. <dir>/all-MiniLM-L6-v2
+EMBEDDING_MODEL_DIR = os.getenv("JARIR_EMBEDDING_MODEL_DIR", "")
+# Seconds a model may stay unused before it is released (0 keeps models forever)
+EMBEDDING_MODEL_IDLE_TTL = float(os.getenv("JARIR_EMBEDDING_MODEL_IDLE_TTL", "900"))
+# Query-embedding cache: entries, TTL in seconds, optional .npz warm file
+QUERY_CACHE_SIZE = int(os.getenv("JARIR_QUERY_CACHE_SIZE", "4096"))
+QUERY_CACHE_TTL = float(os.getenv("JARIR_QUERY_CACHE_TTL", "86400"))
+QUERY_CACHE_FILE = os.getenv("JARIR_QUERY_CACHE_FILE", "")
+
+_models: Dict[str, SentenceTransformer] = {}
+_last_used: Dict[str, float] = {}
+_lock = threading.Lock()
+_reaper: Optional[threading.Thread] = None
+
+_query_cache = LRUCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+_query_cache_loaded = False
+
+
+def resolve_model_path(model_name: str) -> str:
+    """
+    Map a model name to what SentenceTransformer should load:
+    an existing local path as-is, else <EMBEDDING_MODEL_DIR>/<name> if present,
+    else the hub name.
+    """
+    if Path(model_name).exists():
+        return model_name
+    if EMBEDDING_MODEL_DIR:
+        local = Path(EMBEDDING_MODEL_DIR) / model_name
+        if local.exists():
+            return str(local)
+    return model_name
+
+
+def get_embedding_model(model_name: str) -> SentenceTransformer:
+    """Return the shared SentenceTransformer for model_name, loading it on first use."""
+    global _reaper
+    with _lock:
+        model = _models.get(model_name)
+        if model is None:
+            model = SentenceTransformer(resolve_model_path(model_name))
+            _models[model_name] = model
+        _last_used[model_name] = time.monotonic()
+
+        if EMBEDDING_MODEL_IDLE_TTL > 0 and _reaper is None:
+            _reaper = threading.Thread(target=_reap_idle_models, name="embedding-model-reaper", daemon=True)
+            _reaper.start()
+        return model
+
+
+def release_embedding_model(model_name: Optional[str] = None) -> None:
+    """Drop one model (or all of them) from the registry."""
+    with _lock:
+        names = [model_name] if model_name else list(_models)
+        for name in names:
+            _models.pop(name, None)
+            _last_used.pop(name, None)
+    gc.collect()
+
+
+def loaded_models() -> Dict[str, float]:
+    """Model name → seconds since last use, for diagnostics."""
+    now = time.monotonic()
+    with _lock:
+        return {name: now - ts for name, ts in _last_used.items()}
+
+
+def _reap_idle_models() -> None:
+    interval = max(1.0, min(EMBEDDING_MODEL_IDLE_TTL / 2, 60.0))
+    while True:
+        time.sleep(interval)
+        now = time.monotonic()
+        with _lock:
+            idle = [n for n, ts in _last_used.items() if now - ts > EMBEDDING_MODEL_IDLE_TTL]
+            for name in idle:
+                _models.pop(name, None)
+                _last_used.pop(name, None)
+        if idle:
+            log.info("Released idle embedding models: %s", idle)
+            gc.collect()
+
+
+def _normalize_query(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def encode_query(model_name: str, text: str) -> np.ndarray:
+    """
+    Embed one query string with the shared model → L2-normalized float32 row of shape (1, dim).
+
+    Results are cached by (model, normalized text) so repeated spec queries skip
+    the encoder; the returned array is read-only and shared between callers.
+    """
+    _load_query_cache_file()
+    key = (model_name, _normalize_query(text))
+    vec = _query_cache.get(key)
+    if vec is not None:
+        return vec
+
+    model = get_embedding_model(model_name)
+    vec = model.encode([key[1]], convert_to_numpy=True, show_progress_bar=False).astype(np.float32)
+    faiss.normalize_L2(vec)
+    vec.flags.writeable = False
+    _query_cache.set(key, vec)
+    return vec
+
+
+def query_cache_stats() -> Dict[str, Any]:
+    """Size and hit/miss counters of the query-embedding cache."""
+    return _query_cache.stats()
+
+
+def save_query_cache(path: Optional[str] = None) -> None:
+    """Write the live query embeddings to `path` (default QUERY_CACHE_FILE) as .npz."""
+    path = path or QUERY_CACHE_FILE
+    if not path:
+        return
+    entries = list(_query_cache.items())
+    if not entries:
+        return
+    keys = np.array([json.dumps(list(k)) for k, _ in entries])
+    by_dim: Dict[int, List[int]] = {}
+    for i, (_, v) in enumerate(entries):
+        by_dim.setdefault(v.shape[1], []).append(i)
+    # one matrix per embedding size, so several models can share the file
+    arrays = {}
+    for dim, idx in by_dim.items():
+        arrays[f"keys_{dim}"] = keys[idx]
+        arrays[f"vectors_{dim}"] = np.vstack([entries[i][1] for i in idx])
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    try:
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+    except OSError as e:
+        log.warning("Could not write query cache %s: %s", path, e)
+
+
+def _load_query_cache_file() -> None:
+    global _query_cache_loaded
+    if _query_cache_loaded:
+        return
+    with _lock:
+        if _query_cache_loaded:
+            return
+        _query_cache_loaded = True
+        if QUERY_CACHE_FILE and Path(QUERY_CACHE_FILE).exists():
+            try:
+                with np.load(QUERY_CACHE_FILE) as data:
+                    for name in data.files:
+                        if not name.startswith("keys_"):
+                            continue
+                        vectors = data["vectors_" + name[len("keys_"):]]
+                        for raw_key, vec in zip(data[name].tolist(), vectors):
+                            row = vec.reshape(1, -1).astype(np.float32)
+                            row.flags.writeable = False
+                            _query_cache.set(tuple(json.loads(raw_key)), row)
+            except Exception as e:
+                log.warning("Ignoring unreadable query cache %s: %s", QUERY_CACHE_FILE, e)
+        if QUERY_CACHE_FILE:
+            atexit.register(save_query_cache)
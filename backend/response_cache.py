@@ -0,0 +1,142 @@
+"""
+Opt-in semantic cache of conversational replies.
+
+Near-duplicate opening questions ("do you have Apple laptops?", "what tablet
+brands do you sell?") are answered from earlier replies instead of a full agent
+run. Messages are embedded with the shared MiniLM model (model_registry.encode_query)
+and looked up in a small FAISS inner-product index; a hit needs cosine similarity
+of at least SEMANTIC_CACHE_THRESHOLD.
+
+Only first turns of a session without page context are cached, so a reply never
+depends on history the next asker does not share. Entries expire after
+SEMANTIC_CACHE_TTL seconds and are all dropped when tools.catalog_version changes.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import faiss
+import numpy as np
+
+import tools
+from model_registry import encode_query
+
+log = logging.getLogger(__name__)
+
+SEMANTIC_CACHE_ENABLED = os.getenv("JARIR_SEMANTIC_CACHE", "0").lower() in ("1", "true", "yes", "on")
+# Minimum cosine similarity between the new and the cached message
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("JARIR_SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL = float(os.getenv("JARIR_SEMANTIC_CACHE_TTL", "3600"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("JARIR_SEMANTIC_CACHE_SIZE", "1024"))
+
+
+class SemanticCache:
+    """
+    Message-embedding → reply cache backed by faiss.IndexIDMap2(IndexFlatIP).
+
+    Parameters:
+    - model_name: embedding model used for the messages.
+    - threshold: minimum cosine similarity for a hit.
+    - ttl: seconds an entry stays valid.
+    - maxsize: entries kept before the oldest is evicted.
+    """
+
+    def __init__(self, model_name: str, threshold: float, ttl: float, maxsize: int):
+        self.model_name = model_name
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._index: Optional[faiss.IndexIDMap2] = None
+        # id → (expires_at, message, reply), oldest first
+        self._entries: "OrderedDict[int, Tuple[float, str, str]]" = OrderedDict()
+        self._next_id = 0
+        self._version = tools.catalog_version
+        self._lock = threading.Lock()
+
+    def _check_version(self) -> None:
+        if self._version != tools.catalog_version:
+            self._reset()
+            self._version = tools.catalog_version
+
+    def _reset(self) -> None:
+        if self._index is not None:
+            self._index.reset()
+        self._entries.clear()
+
+    def _remove(self, ids: list) -> None:
+        if ids:
+            self._index.remove_ids(np.asarray(ids, dtype=np.int64))
+            for i in ids:
+                self._entries.pop(i, None)
+
+    def lookup(self, message: str) -> Optional[str]:
+        """Cached reply to a message similar enough to `message`, else None."""
+        vec = encode_query(self.model_name, message)
+        with self._lock:
+            self._check_version()
+            if self._index is None or self._index.ntotal == 0:
+                self.misses += 1
+                return None
+            scores, ids = self._index.search(vec, 1)
+            score, entry_id = float(scores[0][0]), int(ids[0][0])
+            entry = self._entries.get(entry_id)
+            if entry is None or score < self.threshold:
+                self.misses += 1
+                return None
+            expires_at, cached_message, reply = entry
+            if expires_at < time.monotonic():
+                self._remove([entry_id])
+                self.misses += 1
+                return None
+            self.hits += 1
+        log.debug("Semantic cache hit (%.3f): %r ~ %r", score, message, cached_message)
+        return reply
+
+    def store(self, message: str, reply: str) -> None:
+        vec = encode_query(self.model_name, message)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version()
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vec.shape[1]))
+            expired = [i for i, (exp, _, _) in self._entries.items() if exp < now]
+            overflow = len(self._entries) - len(expired) + 1 - self.maxsize
+            if overflow > 0:
+                gone = set(expired)
+                live = [i for i in self._entries if i not in gone]
+                expired += live[:overflow]
+            self._remove(expired)
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vec, np.asarray([entry_id], dtype=np.int64))
+            self._entries[entry_id] = (now + self.ttl, message, reply)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": SEMANTIC_CACHE_ENABLED,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+semantic_cache = SemanticCache(
+    tools.EMBEDDING_MODEL,
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    ttl=SEMANTIC_CACHE_TTL,
+    maxsize=SEMANTIC_CACHE_SIZE,
+)
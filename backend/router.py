@@ -0,0 +1,267 @@
+"""
+Deterministic fast path in front of the agent.
+
+Messages that fully specify a product search ("show me Lenovo Yoga Pro 7 32 GB RAM",
+"HP laptops with 1 TB SSD") are mapped onto get_product_recommendations arguments
+by matching them against the catalog vocabulary (brands, models, RAM and storage
+values). Only when every word of the message is accounted for is the tool called
+directly; anything else (budgets, use cases, Arabic, follow-ups) goes to the agent.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+import tools
+
+log = logging.getLogger(__name__)
+
+# Set to 0 to send every message through the agent
+FAST_ROUTER_ENABLED = os.getenv("JARIR_FAST_ROUTER", "1").lower() not in ("0", "false", "no", "off")
+
+# catalog name (tools.CATALOG_SOURCES) → product_type argument of get_product_recommendations
+CATALOG_PRODUCT_TYPES = {
+    "gaming": "gaming",
+    "laptops": "laptop",
+    "tablets": "tablet",
+    "twoin1": "twoin1",
+    "desktops": "desktop",
+    "aio": "aio",
+}
+
+# Product-type phrases, checked in order; each consumes its words from the message
+_TYPE_PATTERNS: List[Tuple[str, List[List[str]]]] = [
+    ("gaming", [["gaming", "laptops"], ["gaming", "laptop"], ["gaming", "pcs"], ["gaming", "pc"],
+                ["gaming", "desktops"], ["gaming", "desktop"], ["gaming"]]),
+    ("twoin1", [["2", "in", "1"], ["two", "in", "one"], ["twoin1"], ["2in1"], ["convertible"], ["convertibles"]]),
+    ("aio", [["all", "in", "one"], ["allinone"], ["aio"]]),
+    ("tablets", [["tablets"], ["tablet"]]),
+    ("desktops", [["desktops"], ["desktop"], ["pcs"], ["pc"]]),
+    ("laptops", [["laptops"], ["laptop"], ["notebooks"], ["notebook"]]),
+]
+
+# Words that carry no search intent beyond "show me products"
+_FILLER = {
+    "a", "an", "and", "any", "are", "buy", "can", "could", "do", "find", "for", "get", "give",
+    "have", "i", "im", "in", "is", "like", "list", "looking", "me", "need", "of", "options",
+    "please", "pls", "recommend", "recommendations", "search", "see", "show", "some", "the",
+    "there", "to", "want", "with", "would", "you", "your", "what", "which", "available",
+}
+
+# Letters and digits of any script: Arabic (or any other) words become tokens the
+# vocabulary cannot account for, so such messages go to the agent instead of being dropped
+_TOKEN_RE = re.compile(r"[^\W_]+(?:\.[0-9]+)?")
+_SIZE_RE = re.compile(r"(\d)(gb|tb)\b")
+
+_vocab: Optional[Dict[str, Any]] = None
+_vocab_version = -1
+_vocab_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {"routed": 0, "fell_through": 0, "no_results": 0, "errors": 0, "total_s": 0.0, "max_s": 0.0}
+
+
+def _tokens(text: str) -> List[str]:
+    text = _SIZE_RE.sub(r"\1 \2", text.lower())
+    return _TOKEN_RE.findall(text)
+
+
+def _build_vocab() -> Dict[str, Any]:
+    """
+    Per catalog: brands and their models as token tuples, plus the RAM and storage
+    values as stored in the CSV. Catalogs sharing a CSV are read once.
+    """
+    catalogs: Dict[str, Dict[str, Any]] = {}
+    by_path: Dict[str, str] = {}
+    for name, (path, _) in tools.CATALOG_SOURCES.items():
+        if path in by_path:
+            catalogs[name] = catalogs[by_path[path]]
+            continue
+        by_path[path] = name
+        df = pd.read_csv(path, usecols=lambda c: c in ("brand", "model", "ram", "storage"))
+        brands: Dict[str, str] = {}
+        models: Dict[Tuple[str, ...], Tuple[str, str]] = {}
+        for brand, model in df[["brand", "model"]].dropna().drop_duplicates().itertuples(index=False):
+            brands[" ".join(_tokens(str(brand)))] = str(brand)
+            key = tuple(_tokens(str(model)))
+            if key:
+                models[key] = (str(brand), str(model))
+        catalogs[name] = {
+            "brands": brands,
+            "models": models,
+            "ram": {str(v).lower(): str(v) for v in df.get("ram", pd.Series(dtype=str)).dropna().unique()},
+            "storage": {str(v).lower(): str(v) for v in df.get("storage", pd.Series(dtype=str)).dropna().unique()},
+        }
+
+    brand_tokens = {tuple(b.split()) for c in catalogs.values() for b in c["brands"] if b}
+    model_tokens = {m for c in catalogs.values() for m in c["models"]}
+    return {
+        "catalogs": catalogs,
+        # one name per CSV, searched when the message names no product type
+        "distinct": list(by_path.values()),
+        # longest phrases first so "surface pro 11" wins over "surface"
+        "brand_phrases": sorted(brand_tokens, key=len, reverse=True),
+        "model_phrases": sorted(model_tokens, key=len, reverse=True),
+    }
+
+
+def _get_vocab() -> Dict[str, Any]:
+    global _vocab, _vocab_version
+    with _vocab_lock:
+        if _vocab is None or _vocab_version != tools.catalog_version:
+            _vocab = _build_vocab()
+            _vocab_version = tools.catalog_version
+        return _vocab
+
+
+def _consume(tokens: List[Optional[str]], phrase: Tuple[str, ...] | List[str]) -> bool:
+    """Blank out the first occurrence of `phrase` in tokens; False if it is absent."""
+    n = len(phrase)
+    for i in range(len(tokens) - n + 1):
+        if all(tokens[i + j] == phrase[j] for j in range(n)):
+            for j in range(n):
+                tokens[i + j] = None
+            return True
+    return False
+
+
+def _consume_sizes(tokens: List[Optional[str]], suffixes: set) -> List[Tuple[str, str]]:
+    """Pull out "<n> gb|tb <suffix>" triples, e.g. 32 gb ram / 1 tb ssd → [("32", "GB"), ...]."""
+    found = []
+    for i in range(len(tokens) - 2):
+        n, unit, what = tokens[i], tokens[i + 1], tokens[i + 2]
+        if n and n.isdigit() and unit in ("gb", "tb") and what in suffixes:
+            found.append((n, unit.upper()))
+            tokens[i] = tokens[i + 1] = tokens[i + 2] = None
+    return found
+
+
+def extract_request(message: str) -> Optional[Dict[str, str]]:
+    """
+    Map a message onto get_product_recommendations arguments, or None when the
+    message says anything the catalog vocabulary cannot account for.
+
+    Parameters:
+    - message: the raw user message.
+    """
+    vocab = _get_vocab()
+    catalogs = vocab["catalogs"]
+    tokens: List[Optional[str]] = list(_tokens(message))
+    if not tokens:
+        return None
+
+    requested_types = []
+    for catalog_name, phrases in _TYPE_PATTERNS:
+        for phrase in phrases:
+            while _consume(tokens, phrase):
+                requested_types.append(catalog_name)
+    if len(set(requested_types)) > 1:
+        return None
+
+    rams = _consume_sizes(tokens, {"ram", "memory"})
+    storages = _consume_sizes(tokens, {"ssd", "storage", "hdd"})
+
+    model_tokens = next((p for p in vocab["model_phrases"] if _consume(tokens, p)), None)
+    brand_tokens = next((p for p in vocab["brand_phrases"] if _consume(tokens, p)), None)
+
+    if any(t is not None and t not in _FILLER for t in tokens):
+        return None
+    if len(rams) > 1 or len(storages) > 1 or (model_tokens is None and brand_tokens is None):
+        return None
+
+    # Catalogs the request could target: the named one, else every catalog holding the model
+    names = [requested_types[0]] if requested_types else vocab["distinct"]
+    brand_key = " ".join(brand_tokens) if brand_tokens else None
+
+    candidates = []
+    for name in names:
+        cat = catalogs[name]
+        if model_tokens is not None:
+            hit = cat["models"].get(model_tokens)
+            if hit is None or (brand_key and " ".join(_tokens(hit[0])) != brand_key):
+                continue
+            brand, model = hit
+        else:
+            if not requested_types or brand_key not in cat["brands"]:
+                continue  # a bare brand is too broad to search without a product type
+            brand, model = cat["brands"][brand_key], None
+        candidates.append((name, brand, model))
+    if len(candidates) != 1:
+        return None
+
+    name, brand, model = candidates[0]
+    cat = catalogs[name]
+    args = {"brand": brand, "product_type": CATALOG_PRODUCT_TYPES[name]}
+    if model:
+        args["model"] = model
+    if rams:
+        ram = cat["ram"].get(f"{rams[0][0]} gb ram")
+        if ram is None or rams[0][1] != "GB":
+            return None
+        args["ram"] = ram
+    if storages:
+        n, unit = storages[0]
+        storage = cat["storage"].get(f"{n} {unit.lower()} ssd") or cat["storage"].get(f"{n} {unit.lower()}")
+        if storage is None:
+            return None
+        args["storage"] = storage
+    return args
+
+
+def try_fast_path(message: str) -> Optional[Dict[str, Any]]:
+    """
+    Answer `message` without the agent when extract_request() is confident.
+    Returns the product payload dict, or None to fall through to the agent.
+    """
+    if not FAST_ROUTER_ENABLED:
+        return None
+    started = time.perf_counter()
+    outcome = "fell_through"
+    payload = None
+    try:
+        args = extract_request(message)
+        if args is not None:
+            log.debug("Fast path: %s", args)
+            output = tools.get_product_recommendations.invoke(args)
+            try:
+                data = json.loads(output)
+            except (json.JSONDecodeError, TypeError):
+                data = None
+            if isinstance(data, dict) and data.get("items"):
+                payload, outcome = data, "routed"
+            else:
+                outcome = "no_results"  # let the agent suggest alternatives
+    except Exception as e:
+        log.warning("Fast path failed, using the agent: %s", e)
+        outcome = "errors"
+    finally:
+        elapsed = time.perf_counter() - started
+        with _stats_lock:
+            _stats[outcome] += 1
+            _stats["total_s"] += elapsed
+            _stats["max_s"] = max(_stats["max_s"], elapsed)
+    return payload
+
+
+def router_stats() -> Dict[str, Any]:
+    """Short-circuit counters and routing time of the fast path."""
+    with _stats_lock:
+        s = dict(_stats)
+    calls = s["routed"] + s["fell_through"] + s["no_results"] + s["errors"]
+    return {
+        "enabled": FAST_ROUTER_ENABLED,
+        "calls": calls,
+        "routed": s["routed"],
+        "fell_through": s["fell_through"],
+        "no_results": s["no_results"],
+        "errors": s["errors"],
+        "short_circuit_rate": s["routed"] / calls if calls else 0.0,
+        "avg_ms": 1000 * s["total_s"] / calls if calls else 0.0,
+        "max_ms": 1000 * s["max_s"],
+    }
@@ -0,0 +1,98 @@
+"""
+Per-stage timing of agent turns via a LangChain callback handler.
+
+    timer = StageTimer()
+    agent_core.add_callback(timer)      # every turn now reports its LLM and tool calls
+    ...
+    timer.summary()   # {"llm": {...}, "tool:get_product_recommendations": {...}, ...}
+
+Stages are "llm" (one chat-model call) and "tool:<name>" (one tool run).
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list (0.0 when empty)."""
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+class StageTimer(BaseCallbackHandler):
+    """Collects the duration of every chat-model call and tool run, by stage name."""
+
+    # tools run in executor threads; the callbacks must not wait for the event loop
+    run_inline = True
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._started: Dict[UUID, tuple] = {}
+        self.samples: Dict[str, List[float]] = {}
+
+    def _start(self, run_id: UUID, stage: str) -> None:
+        self._started[run_id] = (stage, time.perf_counter())
+
+    def _end(self, run_id: UUID, error: bool = False) -> None:
+        entry = self._started.pop(run_id, None)
+        if entry is None:
+            return
+        stage, started = entry
+        if error:
+            stage += ":error"
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.samples.setdefault(stage, []).append(elapsed)
+
+    # chat models
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, "llm")
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error=True)
+
+    # tools
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+        self._start(run_id, f"tool:{name}")
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error=True)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.samples.clear()
+
+    def summary(self, total_s: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Per stage: count, total/mean/p50/p95/p99 in ms, and, given the summed
+        request time `total_s`, the stage's share of it.
+        """
+        with self._lock:
+            samples = {k: sorted(v) for k, v in self.samples.items()}
+        out = {}
+        for stage, values in sorted(samples.items()):
+            total = sum(values)
+            out[stage] = {
+                "count": len(values),
+                "total_ms": round(1000 * total, 1),
+                "mean_ms": round(1000 * total / len(values), 2),
+                "p50_ms": round(1000 * percentile(values, 0.50), 2),
+                "p95_ms": round(1000 * percentile(values, 0.95), 2),
+                "p99_ms": round(1000 * percentile(values, 0.99), 2),
+            }
+            if total_s:
+                out[stage]["share"] = round(total / total_s, 3)
+        return out
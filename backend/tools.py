@@ -1,7 +1,12 @@
 from dbSearch import exact_search_catalog
-from dbSearch import create_catalog_index
-from typing import Set, TypedDict, List, Dict, Any, Optional
-from langchain.chat_models import init_chat_model
+from dbSearch import load_catalog, clear_catalog_registry
+from cache_utils import LRUCache
+from singleflight import SingleFlight
+from metrics import EXACT_SEARCH_SECONDS, FAMILY_CARDS_SECONDS, HYBRID_SEARCH_SECONDS
+from dbSearch import get_rows_by_ids, get_family_cards
+from dbSearch import FALLBACK_PRODUCT_URL, PLACEHOLDER_IMAGE_URL, card_text, card_value
+from dbSearch import hybrid_search_catalog
+from typing import Set, TypedDict, List, Dict, Any, Optional, Tuple
 from langchain_core.messages import AnyMessage, SystemMessage, HumanMessage, AIMessage, ChatMessage
 from langchain_core.tools import tool
 import json
@@ -10,10 +15,22 @@ from typing import List, Dict, Any
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field, ConfigDict, AliasChoices
 from pathlib import Path
+from log_setup import SAMPLED
+import logging
+import os
+import threading
+
+log = logging.getLogger(__name__)
 
-llm = init_chat_model("google_genai:gemini-2.5-flash")
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 
+# "exact" = spec matching only; "hybrid" = exact first, FAISS kNN fills the remaining slots
+SEARCH_MODE = os.getenv("JARIR_SEARCH_MODE", "exact")
+# Semantic hits below this cosine similarity are dropped in hybrid mode
+SEMANTIC_MIN_SIMILARITY = float(os.getenv("JARIR_SEMANTIC_MIN_SIMILARITY", "0.5"))
+# "exact_first" or "rrf" (see dbSearch.hybrid_search_catalog)
+SEARCH_FUSION = os.getenv("JARIR_SEARCH_FUSION", "exact_first")
+
 PROJECT_ROOT = Path(__file__).parent.parent
 
 # Define absolute paths to CSV files
@@ -26,7 +43,53 @@ AIO_CSV_PATH = PROJECT_ROOT / "data" / "jarir_AIO.csv"
 
 
 GAMING_SPEC_COLUMNS = ["brand", "model", "cpu_model", "gpu_model", "ram", "storage","price"]  
-gaming_laptop_catalog = create_catalog_index(GAMING_CSV_PATH, GAMING_SPEC_COLUMNS, EMBEDDING_MODEL)
+
+
+_search_flight = SingleFlight()
+
+
+def _search_catalog(
+    name: str, specs: Dict[str, str], catalog: Dict[str, Any], one_per_family: bool = False,
+) -> List[Dict[str, Any]]:
+    if SEARCH_MODE == "hybrid":
+        with HYBRID_SEARCH_SECONDS.labels(name).time():
+            return hybrid_search_catalog(
+                specs, catalog,
+                min_similarity=SEMANTIC_MIN_SIMILARITY,
+                fusion=SEARCH_FUSION,
+                one_per_family=one_per_family,
+            )
+    with EXACT_SEARCH_SECONDS.labels(name).time():
+        return exact_search_catalog(specs, catalog, one_per_family=one_per_family)
+
+
+def _search(
+    name: str, specs: Dict[str, str], one_per_family: bool = False,
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Search the named catalog; returns (catalog, [{'id': ...}, ...] in ranking order)."""
+    catalog = get_catalog(name)
+    # identical searches already running (same catalog, same specs) share one result;
+    # values are keyed lower-cased since the search matches case-insensitively
+    flight_key = (
+        name, SEARCH_MODE, catalog_version, one_per_family,
+        tuple((k, str(v).lower()) for k, v in specs.items()),
+    )
+    return catalog, _search_flight.do(flight_key, _search_catalog, name, specs, catalog, one_per_family)
+
+
+def _check_catalog(name: str, specs: Dict[str, str]):
+    """
+    Shared body of the check_* tools: search the named catalog and return the
+    matching rows as {"results": [row dict, ...]} in ranking order.
+    """
+    catalog, candidates = _search(name, specs)
+    if not candidates:
+        return "No similar products  found."
+
+    rows = get_rows_by_ids(catalog, [c["id"] for c in candidates])
+    return {
+        "results": rows,
+    }
 
 
 def check_gaming_laptops(specs: Dict[str, str]):
@@ -41,33 +104,12 @@ def check_gaming_laptops(specs: Dict[str, str]):
        "storage":"512GB"
        "price":""}
     """
-    # 1) get the top 5 candidates via our hybrid search
-    candidates = exact_search_catalog(specs, gaming_laptop_catalog)
-    if not candidates:
-        return "No similar products  found."
-
-    # grab the DataFrame out of the catalog
-    df = gaming_laptop_catalog["df"]
+    return _check_catalog("gaming", specs)
 
-    rows = []
-    for c in candidates:
-        # find the matching row by its id
-        row = (
-            df.loc[df["id"] == c["id"]]
-              .iloc[0]                   # get the single matching record
-              .to_dict()
-        )
-        rows.append(row)
-
-    
-    return{
-        "results": rows,
-    }
 #-------------------------------------------------------------------------------------------------
 # Define the catalog index for  laptops
 
 LAPTOP_SPEC_COLUMNS = ["brand", "model", "cpu_model", "gpu_model", "ram", "storage", "renewed","price"]  
-LAPTOP_catalog = create_catalog_index(LAPTOP_CSV_PATH, LAPTOP_SPEC_COLUMNS, EMBEDDING_MODEL)
 
 def check_laptops(specs: Dict[str, str]):
     """
@@ -82,34 +124,12 @@ def check_laptops(specs: Dict[str, str]):
        "renewed"":"renewed or new",
        "price":""}
     """
-    # 1) get the top 5 candidates via our hybrid search
-    candidates = exact_search_catalog(specs, LAPTOP_catalog)
-    if not candidates:
-        return "No similar products  found."
-
-    # grab the DataFrame out of the catalog
-    df = LAPTOP_catalog["df"]
-
-    rows = []
-    for c in candidates:
-        # find the matching row by its id
-        row = (
-            df.loc[df["id"] == c["id"]]
-              .iloc[0]                   # get the single matching record
-              .to_dict()
-        )
-        rows.append(row)
+    return _check_catalog("laptops", specs)
 
-    
-    return{
-        "results": rows,
-    }   
-    
 #-------------------------------------------------------------------------------------------------
 # Define the catalog index for  Tablets
 
 TABLET_SPEC_COLUMNS = ["brand", "model", "cpu_clock","ram", "storage","color", "renewed","price"]  
-TABLET_catalog = create_catalog_index(TABLET_CSV_PATH, TABLET_SPEC_COLUMNS, EMBEDDING_MODEL)
 
 def check_tablets(specs: Dict[str, str]):
     """
@@ -125,45 +145,12 @@ def check_tablets(specs: Dict[str, str]):
        "price":""}
 
     """
-    # 1) get the top 5 candidates via our hybrid search
-    candidates = exact_search_catalog(specs, TABLET_catalog)
-    if not candidates:
-        return "No similar products  found."
-
-    # grab the DataFrame out of the catalog
-    df = TABLET_catalog["df"]
-
-    rows = []
-    for c in candidates:
-        # find the matching row by its id
-        row = (
-            df.loc[df["id"] == c["id"]]
-              .iloc[0]                   # get the single matching record
-              .to_dict()
-        )
-        rows.append(row)
-
-    prompt = f"""
-    I need a product matching these specs: {specs}.
-    Here are 5 candidate products:
-    {rows}
-    Please rank them from best to worst match and briefly explain why.
-    Return only JSON in the form:
-      [
-        {{"id":..., "match_level":"exact|partial|vector", "reason":"…"}}, 
-        …
-      ]
-    """
+    return _check_catalog("tablets", specs)
 
-    return{
-        "results": rows,
-    }   
-    
 #-------------------------------------------------------------------------------------------------
 # Define the catalog index for  2in1 laptops
 
 twoin1_SPEC_COLUMNS = ["brand", "model", "cpu_model","gpu_model","ram", "storage","price"]  
-twoin1_catalog = create_catalog_index(twoin1_CSV_PATH, twoin1_SPEC_COLUMNS, EMBEDDING_MODEL)
 
 def check_twoin1(specs: Dict[str, str]):
     """
@@ -177,34 +164,12 @@ def check_twoin1(specs: Dict[str, str]):
        "gpu_model":"",
        "price":""}
     """
-    # 1) get the top 5 candidates via our hybrid search
-    candidates = exact_search_catalog(specs, twoin1_catalog)
-    if not candidates:
-        return "No similar products  found."
-
-    # grab the DataFrame out of the catalog
-    df = twoin1_catalog["df"]
+    return _check_catalog("twoin1", specs)
 
-    rows = []
-    for c in candidates:
-        # find the matching row by its id
-        row = (
-            df.loc[df["id"] == c["id"]]
-              .iloc[0]                   # get the single matching record
-              .to_dict()
-        )
-        rows.append(row)
-
-    
-    return{
-        "results": rows,
-    }   
-    
 #-------------------------------------------------------------------------------------------------
 # Define the catalog index for  desktops
 
 DESKTOPS_SPEC_COLUMNS = ["brand", "model", "cpu_model","gpu_model","ram", "storage","price"]  
-DESKTOPS_catalog = create_catalog_index(DESKTOPS_CSV_PATH, DESKTOPS_SPEC_COLUMNS, EMBEDDING_MODEL)
 
 def check_desktops(specs: Dict[str, str]):
     """
@@ -218,34 +183,12 @@ def check_desktops(specs: Dict[str, str]):
        "gpu_model":"",
        "price":""}
     """
-    # 1) get the top 5 candidates via our hybrid search
-    candidates = exact_search_catalog(specs, DESKTOPS_catalog)
-    if not candidates:
-        return "No similar products  found."
+    return _check_catalog("desktops", specs)
 
-    # grab the DataFrame out of the catalog
-    df = DESKTOPS_catalog["df"]
-
-    rows = []
-    for c in candidates:
-        # find the matching row by its id
-        row = (
-            df.loc[df["id"] == c["id"]]
-              .iloc[0]                   # get the single matching record
-              .to_dict()
-        )
-        rows.append(row)
-
-    
-    return{
-        "results": rows,
-    }
-    
 #-------------------------------------------------------------------------------------------------
 # Define the catalog index for  AIO devices 
 
 AIO_SPEC_COLUMNS = ["brand", "model", "cpu_model","gpu_model","ram", "storage", "price"]  
-AIO_catalog = create_catalog_index(AIO_CSV_PATH, AIO_SPEC_COLUMNS, EMBEDDING_MODEL)
 
 def check_AIO(specs: Dict[str, str]):
     """
@@ -259,28 +202,103 @@ def check_AIO(specs: Dict[str, str]):
        "gpu_model":"",
        "price":""}
     """
-    # 1) get the top 5 candidates via our hybrid search
-    candidates = exact_search_catalog(specs, AIO_catalog)
-    if not candidates:
-        return "No similar products  found."
+    return _check_catalog("aio", specs)
 
-    # grab the DataFrame out of the catalog
-    df = AIO_catalog["df"]
+#---------------------------------------------------------
+# Lazy catalog loading
+# Catalogs are built the first time a check_* tool needs them (or by warmup()),
+# so importing this module does not embed/index every CSV up front.
 
-    rows = []
-    for c in candidates:
-        # find the matching row by its id
-        row = (
-            df.loc[df["id"] == c["id"]]
-              .iloc[0]                   # get the single matching record
-              .to_dict()
-        )
-        rows.append(row)
+CATALOG_SOURCES: Dict[str, tuple] = {
+    "gaming": (GAMING_CSV_PATH, GAMING_SPEC_COLUMNS),
+    "laptops": (LAPTOP_CSV_PATH, LAPTOP_SPEC_COLUMNS),
+    "tablets": (TABLET_CSV_PATH, TABLET_SPEC_COLUMNS),
+    "twoin1": (twoin1_CSV_PATH, twoin1_SPEC_COLUMNS),
+    "desktops": (DESKTOPS_CSV_PATH, DESKTOPS_SPEC_COLUMNS),
+    "aio": (AIO_CSV_PATH, AIO_SPEC_COLUMNS),
+}
 
-   
-    return{
-        "results": rows,
-    }
+# Comma-separated catalog names preloaded at startup ("all" = every catalog, "" = none)
+WARMUP_CATALOGS = os.getenv("JARIR_WARMUP_CATALOGS", "laptops,gaming")
+
+_catalogs: Dict[str, Dict[str, Any]] = {}
+_catalog_locks: Dict[str, threading.Lock] = {name: threading.Lock() for name in CATALOG_SOURCES}
+
+# Bumped by reload_catalogs(); part of every result-cache key
+catalog_version = 0
+
+
+def get_catalog(name: str) -> Dict[str, Any]:
+    """
+    Return the catalog for `name` (a CATALOG_SOURCES key), building it on first use.
+    Concurrent first calls for the same catalog wait for a single build, and names
+    whose source and spec columns are identical (desktops / aio) share one catalog.
+    """
+    catalog = _catalogs.get(name)
+    if catalog is not None:
+        return catalog
+    if name not in CATALOG_SOURCES:
+        raise KeyError(f"Unknown catalog '{name}'. Available: {list(CATALOG_SOURCES)}")
+
+    with _catalog_locks[name]:
+        catalog = _catalogs.get(name)
+        if catalog is None:
+            csv_path, spec_columns = CATALOG_SOURCES[name]
+            catalog = load_catalog(csv_path, spec_columns, EMBEDDING_MODEL)
+            _catalogs[name] = catalog
+    return catalog
+
+
+def _parse_catalog_names(names: Optional[str]) -> List[str]:
+    if names is None or names.strip().lower() == "all":
+        return list(CATALOG_SOURCES)
+    return [n.strip().lower() for n in names.split(",") if n.strip()]
+
+
+def warmup(names: Optional[List[str]] = None, background: bool = True) -> Optional[threading.Thread]:
+    """
+    Preload catalogs so the first shopper query does not pay for building them.
+
+    Parameters:
+    - names: catalog names to load; defaults to JARIR_WARMUP_CATALOGS.
+    - background: load in a daemon thread and return it instead of blocking.
+    """
+    if names is None:
+        names = _parse_catalog_names(WARMUP_CATALOGS)
+
+    def _load_all() -> None:
+        for name in names:
+            try:
+                get_catalog(name)
+            except Exception as e:
+                log.warning("Warmup of catalog %r failed: %s", name, e)
+
+    if not background:
+        _load_all()
+        return None
+    thread = threading.Thread(target=_load_all, name="catalog-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def reload_catalogs(preload: bool = False) -> int:
+    """
+    Drop every loaded catalog (and the brand/model maps) so they are rebuilt from
+    the CSVs, bump catalog_version and clear caches derived from the old data.
+    Returns the new version.
+    """
+    global catalog_version, brand_model_map, product_type_map
+    for name in CATALOG_SOURCES:
+        with _catalog_locks[name]:
+            _catalogs.pop(name, None)
+    clear_catalog_registry()
+    brand_model_map = build_brand_first_map(csv_paths)
+    product_type_map = build_product_type_first_map(csv_paths)
+    catalog_version += 1
+    _recommendation_cache.clear()
+    if preload:
+        warmup(background=False)
+    return catalog_version
 
 #---------------------------------------------------------
 # Get available models for the required brand
@@ -399,6 +417,8 @@ def _map_raw_product_to_card(product: Dict[str, Any]) -> Optional[Dict[str, Any]
     """
     Map a raw row (from CSV → dict) to the frontend card shape expected by
     consolidate/display tools. Uses fallback values instead of filtering out products.
+    Catalog rows already have their card (dbSearch.build_product_cards, same rules);
+    this is for rows handed to consolidate_products directly.
     
     CSV columns: product_type,brand,model,sku,discount_percent,regular_price_sar,sale_price_sar,
     ai_coprocessor,ai_enabled,color,cpu_clock,cpu_model,gpu_model,image_url,os,ram,release_date,
@@ -407,20 +427,23 @@ def _map_raw_product_to_card(product: Dict[str, Any]) -> Optional[Dict[str, Any]
     """
     try:
         # ID can be from various fields
-        product_id = str(product.get("id") or product.get("sku") or "")
+        product_id = product.get("id")
+        if product_id is None or product_id == "":
+            product_id = product.get("sku")
+        product_id = str(product_id) if product_id is not None else ""
         if not product_id:
-            print(f"[DEBUG] Product filtered: Missing ID/SKU - {product}")
+            log.debug("Product filtered: missing ID/SKU - %s", product, extra=SAMPLED)
             return None
 
-        brand = str(product.get("brand") or "").strip()
-        model = str(product.get("model") or "").strip()
+        brand = card_text(product.get("brand"))
+        model = card_text(product.get("model"))
         name = (brand + " " + model).strip() or "Product"
 
         # Image URL - use fallback if missing
-        image = product.get("image_url") or ""
+        image = card_text(product.get("image_url"))
         if not image or not image.startswith("http"):
-            image = "https://via.placeholder.com/300x200?text=No+Image"
-            print(f"[DEBUG] Using placeholder image for product {product_id}: {name}")
+            image = PLACEHOLDER_IMAGE_URL
+            log.debug("Using placeholder image for product %s: %s", product_id, name, extra=SAMPLED)
 
         # Price handling - CSV has 'sale_price_sar', 'regular_price_sar', and 'price'
         price_value: Optional[float] = None
@@ -438,20 +461,20 @@ def _map_raw_product_to_card(product: Dict[str, Any]) -> Optional[Dict[str, Any]
                     continue
         if price_value is None:
             price_value = 0.0
-            print(f"[DEBUG] No valid price found for product {product_id}: {name}")
+            log.debug("No valid price found for product %s: %s", product_id, name, extra=SAMPLED)
 
         # Product URL - use fallback if missing
-        url = product.get("product_url") or ""
+        url = card_text(product.get("product_url"))
         if not url:
-            url = "https://www.jarir.com/"
-            print(f"[DEBUG] Using fallback URL for product {product_id}: {name}")
+            url = FALLBACK_PRODUCT_URL
+            log.debug("Using fallback URL for product %s: %s", product_id, name, extra=SAMPLED)
 
         # Build badges from available data
         badges: List[str] = []
-        discount = product.get("discount_percent")
-        if discount and str(discount).lower() not in ('nan', 'none', '', 'null'):
+        discount = card_text(product.get("discount_percent"))
+        if discount and discount.lower() not in ('nan', 'none', '', 'null'):
             badges.append(f"{discount} off")
-        if str(product.get("renewed") or "").lower() == "renewed":
+        if card_text(product.get("renewed")).lower() == "renewed":
             badges.append("Renewed")
         else:
             badges.append("New")
@@ -464,17 +487,17 @@ def _map_raw_product_to_card(product: Dict[str, Any]) -> Optional[Dict[str, Any]
             "url": url,
             "badges": badges,
             # Keep additional fields for grouping
-            "color": product.get("color"),
+            "color": card_value(product.get("color")),
             "brand": brand,
             "model": model,
-            "cpu_model": product.get("cpu_model"),
-            "gpu_model": product.get("gpu_model"),
-            "ram": product.get("ram"),
-            "storage": product.get("storage"),
-            "screen_size_inch": product.get("screen_size_inch"),
+            "cpu_model": card_value(product.get("cpu_model")),
+            "gpu_model": card_value(product.get("gpu_model")),
+            "ram": card_value(product.get("ram")),
+            "storage": card_value(product.get("storage")),
+            "screen_size_inch": card_value(product.get("screen_size_inch")),
         }
     except Exception as e:
-        print(f"Error mapping product {product.get('id', 'unknown')}: {e}")
+        log.warning("Error mapping product %s: %s", product.get("id", "unknown"), e, extra=SAMPLED)
         return None
 
 
@@ -490,7 +513,7 @@ def consolidate_products(products: Any) -> List[Dict[str, Any]]:
     else:
         raw_list = products or []
 
-    print(f"[DEBUG] consolidate_products received {len(raw_list)} raw products")
+    log.debug("consolidate_products received %d raw products", len(raw_list))
     
     # First normalize all raw products to the card shape
     normalized: List[Dict[str, Any]] = []
@@ -499,17 +522,21 @@ def consolidate_products(products: Any) -> List[Dict[str, Any]]:
         if mapped:
             normalized.append(mapped)
         else:
-            print(f"[DEBUG] Product {i} was filtered out during mapping")
+            log.debug("Product %d was filtered out during mapping", i, extra=SAMPLED)
 
-    print(f"[DEBUG] After mapping: {len(normalized)} products normalized successfully")
+    log.debug("After mapping: %d products normalized successfully", len(normalized))
     
     if not normalized:
-        print("[DEBUG] No products after normalization - returning empty list")
+        log.debug("No products after normalization - returning empty list")
         return []
+    return _group_cards(normalized)
+
 
+def _group_cards(cards: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Merge cards that differ only in color into one card per core-spec group, in first-seen order."""
     # Group by core specs
     groups: Dict[tuple, Dict[str, Any]] = {}
-    for item in normalized:
+    for item in cards:
         key = (
             item.get("brand"),
             item.get("model"),
@@ -587,7 +614,47 @@ class GetProductRecommendationsArgs(BaseModel):
     # Ignore extraneous arguments like 'products' instead of erroring
     model_config = ConfigDict(populate_by_name=True, extra="ignore")
 
-@tool(args_schema=GetProductRecommendationsArgs)
+# Final JSON per normalized request; catalogs are static between reloads
+RECOMMENDATION_CACHE_SIZE = int(os.getenv("JARIR_RECOMMENDATION_CACHE_SIZE", "2048"))
+_recommendation_cache = LRUCache(maxsize=RECOMMENDATION_CACHE_SIZE)
+
+
+def _normalize_spec(v: Optional[str]) -> Optional[str]:
+    # exact_search_catalog matches str(v).lower() exactly, so case is the only
+    # difference that cannot change the result
+    return str(v).lower() if v else None
+
+
+def _recommendation_cache_key(
+    brand: Optional[str],
+    model: Optional[str],
+    ram: Optional[str],
+    storage: Optional[str],
+    product_type: Optional[str],
+) -> tuple:
+    """Cache key of already normalized (_normalize_spec) arguments."""
+    return (catalog_version, product_type or "", brand or "", model or "", ram or "", storage or "")
+
+
+def _catalog_brand(catalog: Dict[str, Any], brand: str) -> str:
+    """`brand` as the catalog spells it ("lenovo" → "Lenovo"), or as given if no row has it."""
+    wanted = brand.lower()
+    for card in catalog["cards"]:
+        if card["brand"].lower() == wanted:
+            return card["brand"]
+    return brand
+
+
+_recommendation_flight = SingleFlight()
+
+
+def recommendation_cache_stats() -> Dict[str, Any]:
+    """Size and hit/miss counters of the get_product_recommendations result cache."""
+    return {**_recommendation_cache.stats(), "catalog_version": catalog_version}
+
+
+# return_direct: the payload ends the agent turn, no second LLM call to echo it
+@tool(args_schema=GetProductRecommendationsArgs, return_direct=True)
 def get_product_recommendations(
     brand: Optional[str] = None,
     model: Optional[str] = None,
@@ -600,55 +667,79 @@ def get_product_recommendations(
     Provide any known specifications like brand, model, RAM, storage, and product type.
     Product types: laptop, gaming (includes gaming laptops & desktops), tablet, twoin1, desktop, AIO
     """
+    cache_key = _recommendation_cache_key(
+        *(_normalize_spec(v) for v in (brand, model, ram, storage, product_type))
+    )
+    cached = _recommendation_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    # concurrent misses for the same request wait for the first one instead of searching again
+    return _recommendation_flight.do(
+        cache_key, _build_recommendations, cache_key, brand, model, ram, storage, product_type
+    )
+
+
+def _build_recommendations(
+    cache_key: tuple,
+    brand: Optional[str],
+    model: Optional[str],
+    ram: Optional[str],
+    storage: Optional[str],
+    product_type: Optional[str],
+) -> str:
+    # the search matches lower-cased values, like the cache key
     specs = {}
     if brand:
-        specs["brand"] = brand
+        specs["brand"] = _normalize_spec(brand)
     if model:
-        specs["model"] = model
+        specs["model"] = _normalize_spec(model)
     if ram:
-        specs["ram"] = ram
+        specs["ram"] = _normalize_spec(ram)
     if storage:
-        specs["storage"] = storage
+        specs["storage"] = _normalize_spec(storage)
 
     
-    # Step 1: Determine which search tool to use based on product type or brand
-    search_function = check_laptops  # default
+    # Step 1: Determine which catalog to search based on product type or brand
+    catalog_name = "laptops"  # default
     
     if product_type:
         product_type = product_type.lower()
         if product_type in ["gaming", "gaming_laptop"]:
-            search_function = check_gaming_laptops
+            catalog_name = "gaming"
         elif product_type in ["tablet"]:
-            search_function = check_tablets
+            catalog_name = "tablets"
         elif product_type in ["twoin1", "twoin1_laptop", "2in1"]:
-            search_function = check_twoin1
+            catalog_name = "twoin1"
         elif product_type in ["desktop", "desktops"]:
-            search_function = check_desktops
+            catalog_name = "desktops"
         elif product_type in ["aio"]:
-            search_function = check_AIO
-        # else defaults to check_laptops
+            catalog_name = "aio"
+        # else defaults to laptops
     # elif brand and brand.lower() == "apple":
     #     # Apple products are typically in the regular laptops category
     #     search_function = check_laptops
     
-    # Step 2: Call the appropriate search tool internally
-    raw_products = search_function(specs)
+    # Step 2: Search it, one hit per variant family so colors do not crowd out other devices
+    catalog, candidates = _search(catalog_name, specs, one_per_family=True)
     
-    if not raw_products:
+    if not candidates:
         return "Sorry, I couldn't find any products matching those criteria."
 
-    # Step 3: Call the consolidation tool internally (tool → use invoke with dict)
-    consolidated_list = consolidate_products.invoke({"products": raw_products})
+    # Step 3: Hits → their families' precomputed cards (price range, colors)
+    with FAMILY_CARDS_SECONDS.time():
+        consolidated_list = get_family_cards(catalog, [c["id"] for c in candidates])
 
     # Step 4: Call the display tool internally to get the final JSON
-    product_category = product_type or (f"{brand} laptops" if brand else "laptops")
+    product_category = product_type or (f"{_catalog_brand(catalog, brand)} laptops" if brand else "laptops")
     heading = f"Here are some recommendations for {product_category}"
     # display tool is also a tool; invoke with structured args
     from agent_core import display_product_recommendations
 
+    # no callbacks: this is part of the get_product_recommendations run, not an agent tool call
     final_json = display_product_recommendations.invoke({
         "heading": heading,
         "items": consolidated_list,
-    })
+    }, config={"callbacks": []})
 
+    _recommendation_cache.set(cache_key, final_json)
     return final_json
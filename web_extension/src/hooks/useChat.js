@@ -12,6 +12,8 @@ export const useChat = () => {
   const [isLoading, setIsLoading] = useState(false);
   const [inputValue, setInputValue] = useState('');
   const messagesEndRef = useRef(null);
+  // Server-side conversation id; assigned by the backend on the first reply
+  const sessionIdRef = useRef(null);
 
   const scrollToBottom = useCallback(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -35,52 +37,96 @@ export const useChat = () => {
     setInputValue('');
     setIsLoading(true);
 
+    const aiMessageId = Date.now() + 1;
+    let aiText = '';
+    const setAiText = (text) => {
+      aiText = text;
+      setMessages(prev => {
+        const exists = prev.some(m => m.id === aiMessageId);
+        if (!exists) {
+          return [...prev, { id: aiMessageId, text, isUser: false, timestamp: new Date() }];
+        }
+        return prev.map(m => (m.id === aiMessageId ? { ...m, text } : m));
+      });
+    };
+
     try {
-      const response = await fetch('http://127.0.0.1:8000/chat', {
+      // Server-sent events: `token` deltas, `products` payload, then `done` with the final reply
+      const response = await fetch('http://127.0.0.1:8000/chat/stream', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
         body: JSON.stringify({
           message: text.trim(),
+          session_id: sessionIdRef.current,
           context: {} // Optional scraping context for future use
         })
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
 
-      const data = await response.json();
-      
-      // Handle string, object, and array responses from backend
-      let replyText = data.reply ?? 'Sorry, I couldn\'t get a proper response.';
-
-      // If the reply is an array, stringify any object elements and join
-      if (Array.isArray(replyText)) {
-        replyText = replyText
-          .map((part) => {
-            if (part && typeof part === 'object') {
-              // Wrap objects in a JSON code block for product card detection
-              return '```json\n' + JSON.stringify(part, null, 2) + '\n```';
-            }
-            // Keep JSON code blocks intact; otherwise return as-is
-            return typeof part === 'string' ? part : String(part);
-          })
-          .join('\n\n');
-      } else if (replyText && typeof replyText === 'object') {
-        // Single object response: wrap in JSON code block
-        replyText = '```json\n' + JSON.stringify(replyText, null, 2) + '\n```';
-      }
-      
-      const aiMessage = {
-        id: Date.now() + 1,
-        text: replyText,
-        isUser: false,
-        timestamp: new Date()
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let finished = false;
+
+      const handleEvent = (event, data) => {
+        if (event === 'token') {
+          setAiText(aiText + (data.text || ''));
+        } else if (event === 'products') {
+          // Raw JSON is what ProductStrip detection expects
+          setAiText(JSON.stringify(data));
+        } else if (event === 'done') {
+          finished = true;
+          if (data.session_id) sessionIdRef.current = data.session_id;
+          let replyText = data.reply ?? 'Sorry, I couldn\'t get a proper response.';
+
+          // If the reply is an array, stringify any object elements and join
+          if (Array.isArray(replyText)) {
+            replyText = replyText
+              .map((part) => {
+                if (part && typeof part === 'object') {
+                  // Wrap objects in a JSON code block for product card detection
+                  return '```json\n' + JSON.stringify(part, null, 2) + '\n```';
+                }
+                return typeof part === 'string' ? part : String(part);
+              })
+              .join('\n\n');
+          } else if (replyText && typeof replyText === 'object') {
+            // Single object response: wrap in JSON code block
+            replyText = '```json\n' + JSON.stringify(replyText, null, 2) + '\n```';
+          }
+          setAiText(replyText);
+        } else if (event === 'error') {
+          throw new Error(data.detail || 'Stream error');
+        }
       };
 
-      setMessages(prev => [...prev, aiMessage]);
+      while (!finished) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+          const rawEvent = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          let event = 'message';
+          let data = '';
+          for (const line of rawEvent.split('\n')) {
+            if (line.startsWith('event:')) event = line.slice(6).trim();
+            else if (line.startsWith('data:')) data += line.slice(5).trim();
+          }
+          if (data) handleEvent(event, JSON.parse(data));
+        }
+      }
+
+      if (!finished) {
+        throw new Error('Stream ended before the reply was complete');
+      }
     } catch (error) {
       console.error('Chat error:', error);
       
@@ -92,13 +138,15 @@ export const useChat = () => {
         isError: true
       };
 
-      setMessages(prev => [...prev, errorMessage]);
+      // Replace any partial streamed reply with the error
+      setMessages(prev => [...prev.filter(m => m.id !== aiMessageId), errorMessage]);
     } finally {
       setIsLoading(false);
     }
   }, [isLoading]);
 
   const clearMessages = useCallback(() => {
+    sessionIdRef.current = null; // start a fresh conversation
     setMessages([
       {
         id: 1,